@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Renders the interactive mode widgets without a terminal.
+
+The question list, question page and answers are built from generated questions, some with
+very large answers, and rendered to urwid canvases at several terminal sizes, then again
+after the navigation keys. Every render is checked and timed, so that display bugs and slow
+renders show up without running socli in a terminal:
+
+    python scripts/headless.py [--budget MS]
+
+Exits with status 1 if a check fails or a render is too slow. Timings depend on the machine,
+so by default a render may take RELATIVE_BUDGET times a baseline render measured in the same
+run, the scrolling of a BASELINE_LINES lines answer. --budget sets a fixed budget instead.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))  # The socli of this tree
+
+from socli import socli
+from socli.models import Answer, Question, SearchHit
+from socli.render import split_code_blocks
+
+SIZES = [(40, 12), (80, 24), (132, 43), (240, 70)]  # ( columns, rows ) of the screens rendered
+LARGE_ANSWER_LINES = 5000  # Lines of the largest generated answer
+BASELINE_LINES = 1000  # Lines of the answer of the baseline render
+BASELINE_RUNS = 5  # Renders of the baseline, the fastest one counts
+RELATIVE_BUDGET = 150  # Times the baseline a render may take, about 5 times the slowest render
+
+
+def answer_markup(number, lines):
+    """
+    :return: urwid text markup of an answer of about lines lines, alternating paragraphs and code blocks
+    """
+    markup = []
+    for block in range(max(1, lines // 10)):
+        markup.append([u'Paragraph {0} of answer {1} with '.format(block, number), ('code', u'inline_code()'), u' and ',
+                       ('link', u'a link'), (u'less-important', u' [http://example.com]')])
+        markup.append([])
+        markup.extend([[('code-block', u'    value_{0} = compute({1})  # é中'.format(line, block))]
+                       for line in range(7)])
+        markup.append([])
+    return markup
+
+
+def fixture_question(answer_lines=(3, 40, LARGE_ANSWER_LINES)):
+    """
+    :param answer_lines: approximate number of lines of every answer
+    :return: Question object with answers of these sizes, the last one accepted
+    """
+    answers = []
+    for number, lines in enumerate(answer_lines):
+        markup = answer_markup(number, lines)
+        code_blocks = [(u'python', code) for code, _ in split_code_blocks(markup) if code is not None]
+        answers.append(Answer(u'Answer {0}'.format(number), score=number * 7 % 5, accepted=number == len(answer_lines) - 1,
+                              author=u'user{0}'.format(number), created=u'2019-01-01 10:00:00Z',
+                              code_blocks=code_blocks, markup=markup, answer_id=number + 1))
+    desc_markup = [[u'How do I compute every value with ', ('code', u'compute()'), u'?'], [],
+                   [('code-block', u'for i in range(10):')], [('code-block', u'    compute(i)')]]
+    return Question(u'How to compute values in a loop – fixture', u'How do I compute every value?',
+                    u'Votes 5 | Answers {0}'.format(len(answers)), u'https://stackoverflow.com/questions/1/fixture',
+                    answers, desc_markup, u'python')
+
+
+def fixture_results(count=30):
+    """
+    :return: SearchResults object of count generated results, fetched already
+    """
+    hits = [SearchHit(u'Fixture question number {0} about topic {1}'.format(i, i * 37 % 11),
+                      u'Excerpt of question {0}, '.format(i) * (1 + i % 4),
+                      u'https://stackoverflow.com/questions/{0}/fixture'.format(100 + i)) for i in range(count)]
+    results = socli.SearchResults(lambda page: hits if page == 1 else [])
+    results.fetch_all()
+    return results
+
+
+def screen_text(canvas):
+    """
+    :return: list of the rows of a canvas, as text
+    """
+    return [row.decode('utf-8') for row in canvas.text]
+
+
+class RenderCheck(object):
+    """
+    Renders widgets, checks the canvases and records the time taken.
+    """
+
+    def __init__(self, budget=None, dump=False):
+        """
+        :param budget: seconds a render may take, None for RELATIVE_BUDGET times the baseline render
+        :param dump: print every rendered screen
+        """
+        self.budget = budget
+        self.baseline = None  # Seconds of the baseline render
+        self.dump = dump
+        self.failures = []
+        self.timings = []  # ( name, size, seconds )
+
+    def fail(self, name, size, message):
+        self.failures.append('{0} {1}x{2}: {3}'.format(name, size[0], size[1], message))
+
+    def render(self, name, make_widget, size, expected=(), keys=()):
+        """
+        Builds a widget, presses keys on it and renders it, timing all of it.
+        :param name: name of the check in the report
+        :param make_widget: function returning the widget
+        :param size: ( columns, rows ) of the screen
+        :param expected: strings that must be on the screen
+        :param keys: keys pressed before rendering
+        :return: the widget
+        """
+        socli.rendered_answers.clear()  # Widgets of answers are built again for every render
+        start = time.time()
+        widget = make_widget()
+        for key in keys:
+            widget.keypress(size, key)
+        canvas = widget.render(size, focus=True)
+        elapsed = time.time() - start
+        self.timings.append((name, size, elapsed))
+        rows = screen_text(canvas)
+        if self.dump:
+            print('--- {0} {1}x{2}'.format(name, size[0], size[1]))
+            print('\n'.join(rows))
+        if (canvas.cols(), canvas.rows()) != size:
+            self.fail(name, size, 'rendered {0}x{1}'.format(canvas.cols(), canvas.rows()))
+        screen = '\n'.join(rows)
+        for text in expected:
+            if text[:size[0]] not in screen:
+                self.fail(name, size, 'missing {0!r}'.format(text))
+        if elapsed > self.budget:
+            self.fail(name, size, 'took {0:.0f} ms'.format(elapsed * 1000))
+        return widget
+
+    def measure_baseline(self):
+        """
+        :return: seconds of the fastest of BASELINE_RUNS renders of a BASELINE_LINES lines answer
+        """
+        markup = answer_markup(0, BASELINE_LINES)
+        timings = []
+        for _ in range(BASELINE_RUNS):
+            start = time.time()
+            socli.ScrollableTextBox(markup).render((80, 24), focus=True)
+            timings.append(time.time() - start)
+        return min(timings)
+
+    def run(self, sizes=SIZES):
+        socli.header_for_display = socli.Header()
+        self.baseline = self.measure_baseline()
+        if self.budget is None:
+            self.budget = self.baseline * RELATIVE_BUDGET
+        question = fixture_question()
+        for size in sizes:
+            # On small screens the title and footer of the question page leave no room for the answer
+            answer_shown = size[1] >= 24
+            self.render('question list', lambda: socli.SelectQuestionPage(fixture_results()), size,
+                        ['0. Fixture question number 0'])
+            self.render('question page', lambda: socli.QuestionPage(question), size,
+                        ['Question: How to compute'] + (['By user0', 'p: previous answer'] if answer_shown else []))
+            self.render('largest answer', lambda: socli.QuestionPage(question), size,
+                        ['Accepted', 'Paragraph 0 of answer 2'] if answer_shown else [], keys=['n', 'n'])
+            self.render('sorted by votes', lambda: socli.QuestionPage(question), size,
+                        ['Sorted by votes.'], keys=['v'])
+            self.render('answer text', lambda: socli.AnswerText(question.answers), size,
+                        ['Votes 0', 'Paragraph 0 of answer 0'])
+            self.render('scrolled answer', lambda: socli.ScrollableTextBox(question.answers[-1].markup), size,
+                        ['value_'], keys=['page down'] * 20)
+        # The same question page resized, as when the window is
+        page = socli.QuestionPage(question)
+        for size in reversed(sizes):
+            self.render('resized page', lambda: page, size, ['Question: How to compute'])
+        return not self.failures
+
+    def report(self):
+        for name, size, elapsed in self.timings:
+            print('{0:<18} {1:>4}x{2:<3} {3:8.1f} ms'.format(name, size[0], size[1], elapsed * 1000))
+        for failure in self.failures:
+            print('FAILED ' + failure)
+        print('Baseline render {0:.1f} ms, budget {1:.1f} ms'.format(self.baseline * 1000, self.budget * 1000))
+        print('{0} renders, {1} failures'.format(len(self.timings), len(self.failures)))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Renders the interactive mode without a terminal and times it")
+    parser.add_argument('--budget', type=float, metavar='MS',
+                        help="Milliseconds a render may take before it counts as a failure, "
+                             "by default {0} times a baseline render".format(RELATIVE_BUDGET))
+    parser.add_argument('--dump', action='store_true', help="Prints every rendered screen")
+    namespace = parser.parse_args(arguments)
+    check = RenderCheck(namespace.budget / 1000.0 if namespace.budget is not None else None, namespace.dump)
+    check.run()
+    check.report()
+    return 1 if check.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,6 +19,7 @@ setup(
     packages=["socli"],
     entry_points = {"console_scripts": ['socli = socli.socli:main']},
     install_requires=['BeautifulSoup4','requests','colorama','Py-stackExchange', 'urwid'],
+    extras_require={'highlight': ['Pygments'], 'zstd': ['zstandard'], 'rerank': ['numpy']},
     requires=['BeautifulSoup4','requests','colorama','PyStackExchange', 'urwid'],
     version='3.6',
     url='http://www.github.com/gautamkrishnar/socli',
@@ -1,10 +1,16 @@
 import os
+import threading
+import time
 
 from functools import wraps
 from getpass import getpass
 
 from bs4 import BeautifulSoup
 from requests import Session
+from requests.adapters import HTTPAdapter
+
+from . import network
+from .store import atomic_write, user_data_path
 
 # Supporting input in Python 2/3
 try:
@@ -14,14 +20,132 @@ except NameError:
 
 # Supporting LWPCookieJar in Python 2/3
 try:
-    from http.cookiejar import LWPCookieJar
+    from http.cookiejar import LoadError, LWPCookieJar
 except ImportError:
-    from cookielib import LWPCookieJar
+    from cookielib import LoadError, LWPCookieJar
 
-COOKIES_FILE_PATH = '.cookies'
+COOKIES_FILE_PATH = user_data_path('cookies')
+LEGACY_COOKIES_FILE_PATH = '.cookies'  # Used to be relative to the working directory
+LEGACY_COOKIES_DOMAIN = 'stackoverflow.com'  # Domain of every cookie of a legacy file written by socli
 BASE_URL = 'https://stackoverflow.com/'
 LOGIN_URL = BASE_URL + 'users/login'
 LOGOUT_URL = BASE_URL + 'users/logout'
+POOL_SIZE = 10  # Connections kept open per host
+
+
+class AuthState(object):
+    """
+    :desc: Login state of the process. The cookie jar is loaded from disk once,
+           and the expiry of the login cookie is kept in memory. Every request
+           goes through the same pooled session holding the jar.
+    """
+
+    def __init__(self, path=COOKIES_FILE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.session = None
+        self.expires = None  # Expiry timestamp of the `acct` cookie, 0 when not logged in
+
+    def get_session(self):
+        """
+        :desc: Session with the saved cookies, created on first use.
+        :return: requests.Session object
+        """
+        with self.lock:
+            if self.session is None:
+                session = Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.cookies = self.load_cookies()
+                self.session = session
+            return self.session
+
+    def load_cookies(self):
+        cookiejar = LWPCookieJar(filename=self.path)
+        if not os.path.exists(self.path):
+            self.migrate_cookies(cookiejar)
+            # Written even when empty, so that the migration is only tried once
+            self.save_cookies(cookiejar)
+            return cookiejar
+        try:
+            cookiejar.load(ignore_discard=True, ignore_expires=True)
+        except (IOError, LoadError):
+            pass
+        return cookiejar
+
+    def migrate_cookies(self, cookiejar):
+        """
+        :desc: Moves the cookies older versions saved in the working directory into cookiejar.
+               The file is only used and removed if it holds Stack Overflow cookies only,
+               as socli wrote it.
+        :param: cookiejar - LWPCookieJar receiving the cookies
+        """
+        if not os.path.exists(LEGACY_COOKIES_FILE_PATH):
+            return
+        legacy = LWPCookieJar()
+        try:
+            legacy.load(LEGACY_COOKIES_FILE_PATH, ignore_discard=True, ignore_expires=True)
+        except (IOError, LoadError):
+            return
+        cookies = list(legacy)
+        if not cookies or any(not cookie.domain.lstrip('.').endswith(LEGACY_COOKIES_DOMAIN) for cookie in cookies):
+            return
+        for cookie in cookies:
+            cookiejar.set_cookie(cookie)
+        try:
+            os.remove(LEGACY_COOKIES_FILE_PATH)
+        except OSError:
+            pass
+
+    def is_logged_in(self):
+        """
+        :desc: Checks if the cookies contain a cookie named `acct`
+               which is not expired.
+        """
+        if self.expires is None:
+            self.expires = 0
+            for cookie in self.get_session().cookies:
+                if cookie.name == 'acct':
+                    # A cookie without expiry lasts as long as the session
+                    self.expires = cookie.expires or float('inf')
+        return time.time() < self.expires
+
+    def replace_cookies(self, cookiejar):
+        """
+        :desc: Gives the session another cookie jar, in memory only.
+        :param: cookiejar - new jar
+        :return: the jar replaced
+        """
+        session = self.get_session()
+        with self.lock:
+            previous, session.cookies = session.cookies, cookiejar
+            self.expires = None
+        return previous
+
+    def save(self):
+        """
+        :desc: Persists the cookies of the session after a login.
+        """
+        self.expires = None
+        self.save_cookies(self.get_session().cookies)
+
+    def save_cookies(self, cookiejar):
+        atomic_write(self.path, '#LWP-Cookies-2.0\n' +
+                     cookiejar.as_lwp_str(ignore_discard=True, ignore_expires=True))
+
+    def clear(self):
+        """
+        :desc: Forgets the login, in memory and on disk. The cookie file is
+               emptied rather than removed, so that no legacy file is migrated again.
+        """
+        cookiejar = self.get_session().cookies
+        cookiejar.clear()
+        self.expires = 0
+        self.save_cookies(cookiejar)
+
+
+auth_state = AuthState()
 
 
 def login_required(func):
@@ -37,44 +161,23 @@ def login_required(func):
                and is not expired.
         """
 
-        is_login = False
-        resp = {'success': False, 'message': 'You are not logged in!'}
-
-        if os.path.exists(COOKIES_FILE_PATH):
-            cookiejar = LWPCookieJar(filename=COOKIES_FILE_PATH)
-            cookiejar.load()
-
-            for cookie in cookiejar:
-                if cookie.name == 'acct':
-                    expiry_time_obj = datetime.utcfromtimestamp(cookie.expires)
+        if auth_state.is_logged_in():
+            return func(*args, **kwargs)
 
-                    if datetime.now() > expiry_time_obj:
-                        is_login = True
-
-            if not is_login:
-                os.remove(COOKIES_FILE_PATH)
-            else:
-                return func(*args, **kwargs)
-
-        return resp
+        auth_state.clear()
+        return {'success': False, 'message': 'You are not logged in!'}
 
     return wrapper
 
 
 def get_session():
     """
-    :desc: Builds session from the saved cookies, if present.
-           Otherwise, a new session is created.
+    :desc: Session of the process, holding the saved cookies, if present.
+           Connections are pooled and reused across requests.
     :return: requests.Session object
     """
 
-    session = Session()
-
-    if os.path.exists(COOKIES_FILE_PATH):
-        session.cookies = LWPCookieJar(filename=COOKIES_FILE_PATH)
-        session.cookies.load(ignore_discard=True, ignore_expires=True)
-
-    return session
+    return auth_state.get_session()
 
 
 def login_prompt():
@@ -103,19 +206,24 @@ def login(email, password):
     resp = {'success': False}
     data = {'email': email, 'password': password}
     session = get_session()
-    session.cookies = LWPCookieJar(filename=COOKIES_FILE_PATH)
+    # Logs in with a fresh jar, the saved cookies are only replaced if the login succeeds
+    previous = auth_state.replace_cookies(LWPCookieJar(filename=auth_state.path))
 
-    resp_obj = session.post(LOGIN_URL, data=data)
+    try:
+        resp_obj = network.post(session, LOGIN_URL, data=data)
 
-    if resp_obj.status_code == 200:
-        if resp_obj.url == BASE_URL:
-            session.cookies.save(ignore_expires=True, ignore_discard=True)
-            resp['success'] = True
-            resp['message'] = 'Successfully Logged In!'
+        if resp_obj.status_code == 200:
+            if resp_obj.url == BASE_URL:
+                auth_state.save()
+                resp['success'] = True
+                resp['message'] = 'Successfully Logged In!'
+            else:
+                resp['message'] = 'Incorrect credentials'
         else:
-            resp['message'] = 'Incorrect credentials'
-    else:
-        resp['message'] = 'Stackoverflow is probably down. Please try again.'
+            resp['message'] = 'Stackoverflow is probably down. Please try again.'
+    finally:
+        if not resp['success']:
+            auth_state.replace_cookies(previous)
 
     return resp
 
@@ -127,7 +235,7 @@ def logout():
     """
 
     session = get_session()
-    logout_page_resp = session.get(LOGOUT_URL)
+    logout_page_resp = network.get(session, LOGOUT_URL)
     resp = {'success': False}
 
     soup = BeautifulSoup(logout_page_resp.content, 'html.parser')
@@ -135,11 +243,10 @@ def logout():
 
     if fkey_input:
         data = {'fkey': fkey_input['value']}
-        resp_obj = session.post(LOGOUT_URL, data=data)
+        resp_obj = network.post(session, LOGOUT_URL, data=data)
 
         if resp_obj.url == BASE_URL:
-            if os.path.exists(COOKIES_FILE_PATH):
-                os.remove(COOKIES_FILE_PATH)
+            auth_state.clear()
 
             resp['success'] = True
             resp['message'] = 'Successfully Logged Out!'
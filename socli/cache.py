@@ -0,0 +1,307 @@
+"""
+Caches shared by the parts of socli, in memory and on disk.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .store import _makedirs, atomic_write
+
+# Errors raised by decompressing a corrupted entry
+DECOMPRESSION_ERRORS = (zlib.error, zstandard.ZstdError) if zstandard is not None else (zlib.error,)
+
+DISK_CACHE_SIZE = 100 * 1024 * 1024  # Bytes of compressed entries kept per disk cache
+PRUNE_EVERY = 50  # Writes between checks of the size of a disk cache
+DICTIONARY_SAMPLES = 100  # Entries a zstd dictionary is trained on
+DICTIONARY_SIZE = 64 * 1024  # Bytes of a zstd dictionary
+
+
+class LRUCache(object):
+    """
+    Mapping that holds at most capacity entries, dropping the least recently used one when full.
+    With a weigh function, capacity bounds the total weight of the values instead, e.g. their bytes.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, capacity, weigh=None):
+        """
+        :param capacity: number of entries kept, or total weight with weigh
+        :param weigh: function returning the weight of a value, None to count entries
+        """
+        self.capacity = capacity
+        self.weigh = weigh or (lambda value: 1)
+        self.entries = OrderedDict()  # Key => ( value, weight )
+        self.weight = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                entry = self.entries.pop(key)
+            except KeyError:
+                return default
+            self.entries[key] = entry  # Move to the most recently used end
+            return entry[0]
+
+    def __setitem__(self, key, value):
+        weight = self.weigh(value)
+        with self.lock:
+            self._discard(key)
+            self.entries[key] = (value, weight)
+            self.weight += weight
+            self._evict(1)  # The entry just added stays even if it weighs more than the capacity
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[1]
+
+    def _evict(self, keep=0):
+        """ Drops the least recently used entries until the rest fits, keeping at least keep entries. """
+        while self.weight > self.capacity and len(self.entries) > keep:
+            _, (_, weight) = self.entries.popitem(last=False)
+            self.weight -= weight
+            self.evictions += 1
+
+    def resize(self, capacity):
+        """
+        Changes the capacity, dropping the least recently used entries that no longer fit.
+        """
+        with self.lock:
+            self.capacity = capacity
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.weight = 0
+
+    def values(self):
+        """
+        :return: list of the values, least recently used first
+        """
+        with self.lock:
+            return [value for value, _ in self.entries.values()]
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskCache(object):
+    """
+    Compressed values kept in files, one per key, in a directory.
+
+    Values are compressed with zstd when the zstandard package is installed, otherwise with
+    zlib. Once a cache holds enough entries, a zstd dictionary is trained on them: pages of
+    one site share most of their markup, which the dictionary holds once instead of in every
+    entry. Entries are read through mmap, without copying the file into memory first.
+    Every entry records when it was written, so readers can ask for a maximum age.
+    """
+
+    HEADER = struct.Struct('<cd')  # Codec, time written
+    ZLIB = b'g'
+    ZSTD = b'z'
+    ZSTD_DICTIONARY = b'd'
+
+    def __init__(self, directory, max_size=DISK_CACHE_SIZE):
+        """
+        :param directory: directory of the entries, created on the first write
+        :param max_size: bytes of entries kept, the oldest ones are removed beyond that
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.dictionary_path = os.path.join(directory, 'dictionary')
+        self.dictionary = None  # zstandard.ZstdCompressionDict, once loaded
+        self.writes = 0
+        self.maintaining = False  # Whether a maintenance thread is running
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def load_dictionary(self):
+        if self.dictionary is None and zstandard is not None and os.path.exists(self.dictionary_path):
+            with open(self.dictionary_path, 'rb') as dictionary_file:
+                self.dictionary = zstandard.ZstdCompressionDict(dictionary_file.read())
+        return self.dictionary
+
+    def get(self, key, max_age=None):
+        """
+        :param key: string identifying the value, like a url
+        :param max_age: seconds since the value was written beyond which it is not returned, None for any age
+        :return: `bytes` of the value, None if it is not cached, too old or unreadable
+        """
+        try:
+            with open(self.path(key), 'rb') as entry:
+                mapped = mmap.mmap(entry.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):  # ValueError for an empty file
+            return None
+        try:
+            if len(mapped) < self.HEADER.size:
+                return None
+            codec, written = self.HEADER.unpack_from(mapped)
+            if max_age is not None and time.time() - written > max_age:
+                return None
+            try:
+                view = memoryview(mapped)
+            except TypeError:  # Python 2 mmap objects can not be viewed, the payload is copied
+                return self.decompress(codec, mapped[self.HEADER.size:])
+            payload = view[self.HEADER.size:]
+            try:
+                return self.decompress(codec, payload)
+            finally:
+                payload.release()
+                view.release()
+        except DECOMPRESSION_ERRORS:
+            return None  # Corrupted entry
+        finally:
+            mapped.close()
+
+    def decompress(self, codec, payload):
+        """
+        :return: `bytes` of the value, None if it was written with zstd and zstandard is not installed
+        """
+        if codec == self.ZLIB:
+            return zlib.decompress(payload)
+        if zstandard is None:
+            return None
+        if codec == self.ZSTD_DICTIONARY:
+            return zstandard.ZstdDecompressor(dict_data=self.load_dictionary()).decompress(payload)
+        return zstandard.ZstdDecompressor().decompress(payload)
+
+    def age(self, key):
+        """
+        :return: seconds since the value of key was written, None if it is not cached
+        """
+        try:
+            with open(self.path(key), 'rb') as entry:
+                header = entry.read(self.HEADER.size)
+            return time.time() - self.HEADER.unpack(header)[1]
+        except (IOError, OSError, struct.error):
+            return None
+
+    def put(self, key, value):
+        """
+        :param key: string identifying the value
+        :param value: `bytes` to store
+        """
+        if zstandard is None:
+            codec, payload = self.ZLIB, zlib.compress(value, 6)
+        elif self.load_dictionary() is not None:
+            compressor = zstandard.ZstdCompressor(level=3, dict_data=self.dictionary)
+            codec, payload = self.ZSTD_DICTIONARY, compressor.compress(value)
+        else:
+            codec, payload = self.ZSTD, zstandard.ZstdCompressor(level=3).compress(value)
+        atomic_write(self.path(key), self.HEADER.pack(codec, time.time()) + payload, sync=False)
+        with self.lock:
+            self.writes += 1
+            check = self.writes % PRUNE_EVERY == 1 and not self.maintaining
+            if check:
+                self.maintaining = True
+        if check:
+            # Listing the whole directory takes a while, the request that wrote the entry does not wait for it
+            worker = threading.Thread(target=self.maintain)
+            worker.daemon = True
+            worker.start()
+
+    def maintain(self):
+        """ Prunes the cache, and trains the zstd dictionary once there are enough entries. """
+        try:
+            self.prune()
+            if zstandard is not None and self.dictionary is None:
+                self.train_dictionary()
+        finally:
+            with self.lock:
+                self.maintaining = False
+
+    def entries(self):
+        """
+        :return: list of ( modification time, size, path ) of the entries
+        """
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if len(name) != 40:  # Not a sha1, like the dictionary or a temporary file
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        """
+        :return: bytes of the entries on disk
+        """
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self):
+        """ Removes the oldest entries while the cache is larger than max_size. """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def train_dictionary(self):
+        """ Trains a zstd dictionary on the latest entries once there are enough of them. """
+        entries = sorted(self.entries(), reverse=True)[:DICTIONARY_SAMPLES * 2]
+        if len(entries) < DICTIONARY_SAMPLES:
+            return
+        samples = []
+        for _, _, path in entries:
+            value = self.get_path(path)
+            if value is not None:
+                samples.append(value)
+        try:
+            dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, samples)
+        except zstandard.ZstdError:
+            return  # Too few or too small samples
+        _makedirs(self.directory)
+        atomic_write(self.dictionary_path, dictionary.as_bytes(), sync=False)
+        self.dictionary = dictionary
+
+    def get_path(self, path):
+        try:
+            with open(path, 'rb') as entry:
+                data = entry.read()
+            codec, _ = self.HEADER.unpack_from(data)
+            return self.decompress(codec, data[self.HEADER.size:])
+        except (IOError, OSError, struct.error) + DECOMPRESSION_ERRORS:
+            return None
+
+    def clear(self):
+        """ Removes all the entries and the dictionary. """
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if os.path.exists(self.dictionary_path):
+            os.remove(self.dictionary_path)
+        self.dictionary = None
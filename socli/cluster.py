@@ -0,0 +1,167 @@
+"""
+Grouping of search results that lead to the same answers.
+
+Searches often return a question together with its duplicates, each closed with a link
+to the original. Results are grouped when one is known to be a duplicate of another.
+Optionally, results are also grouped when their titles have the same words and their
+titles and excerpts are nearly the same. Similarity is estimated with MinHash signatures
+of the character shingles of the text, and locality sensitive hashing only compares a
+result with the groups sharing a band of its signature. Questions differing by a single
+word, like the language they ask about, are close in shingles, hence the title rule.
+"""
+
+import re
+import zlib
+
+from .cache import LRUCache
+
+SHINGLE_SIZE = 5  # Characters per shingle
+BANDS = 16  # Bands of the signature compared by locality sensitive hashing
+ROWS = 4  # Hashes per band
+SIMILARITY_THRESHOLD = 0.9  # Estimated Jaccard similarity above which two results are duplicates
+SIGNATURE_CACHE_SIZE = 1000  # Number of signatures kept
+
+# One mask per hash of the signature, mixed with a shingle's hash to make a family of hash functions
+_masks = [zlib.crc32(('socli-minhash-%d' % i).encode('utf-8')) & 0xffffffff for i in range(BANDS * ROWS)]
+_word_re = re.compile(r"\w+", re.UNICODE)
+
+signatures = LRUCache(SIGNATURE_CACHE_SIZE)
+
+
+def shingles(text):
+    """
+    :param text: string
+    :return: set of the overlapping SHINGLE_SIZE character substrings of the normalized text
+    """
+    text = ' '.join(_word_re.findall(text.lower()))
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return set(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+
+def signature(hit):
+    """
+    :param hit: SearchHit object
+    :return: MinHash signature of its title and excerpt, a tuple of BANDS * ROWS hashes, None if there is no text
+    """
+    key = (hit.title, hit.desc)
+    if key in signatures:
+        return signatures.get(key)
+    hashes = [zlib.crc32(shingle.encode('utf-8')) & 0xffffffff for shingle in shingles(hit.title + ' ' + hit.desc)]
+    result = tuple(min(h ^ mask for h in hashes) for mask in _masks) if hashes else None
+    signatures[key] = result
+    return result
+
+
+def title_words(hit):
+    """
+    :param hit: SearchHit object
+    :return: frozenset of the lowercase words of its title
+    """
+    return frozenset(_word_re.findall(hit.title.lower()))
+
+
+def similarity(first, second):
+    """
+    :return: estimated Jaccard similarity of the shingles behind two signatures
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / float(len(first))
+
+
+class Clusters(object):
+    """
+    Groups of duplicate search results, built one result at a time.
+    The first result of a group represents it, unless the original question
+    of duplicates listed before turns up later.
+    """
+
+    def __init__(self, thread=None, duplicate_of=None, similar=False):
+        """
+        :param thread: function returning a key identifying the thread of a SearchHit, or None
+        :param duplicate_of: function returning the thread key of the question a SearchHit is
+                             known to be a duplicate of, or None
+        :param similar: also group results with the same title words and nearly the same text
+        """
+        self.thread = thread or (lambda hit: None)
+        self.duplicate_of = duplicate_of or (lambda hit: None)
+        self.similar = similar
+        self.groups = []  # Lists of SearchHit objects, the representative first
+        self.threads = {}  # Thread key => index of the group holding it or its duplicates
+        self.buckets = {}  # ( band number, band of signature ) => indexes of groups
+        self.signatures = []  # Signature of the representative of every group
+        self.titles = []  # Title words of the representative of every group
+
+    def add(self, hit):
+        """
+        Adds a result to the group of its duplicates, or to a new group.
+        :param hit: SearchHit object
+        :return: index of its group, equal to the previous number of groups for a new group
+        """
+        key = self.thread(hit)
+        original = self.duplicate_of(hit)
+        hit_signature = signature(hit) if self.similar else None
+        index = self.threads.get(original) if original is not None else None
+        if index is None and key is not None and key in self.threads:
+            # Duplicates of this question were listed before it: it represents them from now on
+            index = self.threads[key]
+            self.groups[index].insert(0, hit)
+            self.signatures[index] = hit_signature
+            self.titles[index] = title_words(hit)
+        elif index is None:
+            index = self.find_similar(hit, hit_signature)
+            if index is None:
+                index = len(self.groups)
+                self.groups.append([])
+                self.signatures.append(hit_signature)
+                self.titles.append(title_words(hit))
+            self.groups[index].append(hit)
+        else:
+            self.groups[index].append(hit)
+        for thread in (key, original):
+            if thread is not None:
+                self.threads.setdefault(thread, index)
+        if hit_signature is not None:
+            for band in range(BANDS):
+                self.buckets.setdefault((band, hit_signature[band * ROWS:(band + 1) * ROWS]), set()).add(index)
+        return index
+
+    def find_similar(self, hit, hit_signature):
+        """
+        :param hit: SearchHit object
+        :param hit_signature: its signature
+        :return: index of a group whose representative has the same title words and a similar
+                 signature, None if there is none
+        """
+        if hit_signature is None:
+            return None
+        words = title_words(hit)
+        candidates = set()
+        for band in range(BANDS):
+            candidates.update(self.buckets.get((band, hit_signature[band * ROWS:(band + 1) * ROWS]), ()))
+        for index in sorted(candidates):
+            group_signature = self.signatures[index]
+            if (group_signature is not None and self.titles[index] == words and
+                    similarity(hit_signature, group_signature) >= SIMILARITY_THRESHOLD):
+                return index
+        return None
+
+    def representatives(self):
+        """
+        :return: list of the SearchHit representing every group, in order
+        """
+        return [group[0] for group in self.groups]
+
+
+def collapse(hits, thread=None, duplicate_of=None, similar=False):
+    """
+    Keeps one result per group of duplicates.
+    :param hits: list of SearchHit objects
+    :param thread: see Clusters
+    :param duplicate_of: see Clusters
+    :param similar: see Clusters
+    :return: list of SearchHit objects
+    """
+    clusters = Clusters(thread, duplicate_of, similar)
+    for hit in hits:
+        clusters.add(hit)
+    return clusters.representatives()
@@ -0,0 +1,140 @@
+"""
+Syntax highlighting of code blocks, using Pygments when it is installed.
+
+Highlighted code is cached by the hash of the code and its language, and computed
+by a worker thread so that displaying a post never waits for it.
+"""
+
+import hashlib
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from pygments import lex
+    from pygments.lexers import get_lexer_by_name, guess_lexer
+    from pygments.token import Comment, Keyword, Name, Number, Operator, String
+    from pygments.util import ClassNotFound
+except ImportError:
+    lex = None
+
+from .cache import LRUCache
+
+HIGHLIGHT_CACHE_SIZE = 500  # Number of highlighted code blocks kept
+
+# Pygments token types to palette attributes, most specific first
+if lex is not None:
+    TOKEN_ATTRIBUTES = [
+        (Comment, 'code-comment'),
+        (String, 'code-string'),
+        (Number, 'code-number'),
+        (Keyword, 'code-keyword'),
+        (Name.Builtin, 'code-keyword'),
+        (Name.Function, 'code-name'),
+        (Name.Class, 'code-name'),
+        (Name.Decorator, 'code-name'),
+        (Operator.Word, 'code-keyword'),
+    ]
+
+highlighted = LRUCache(HIGHLIGHT_CACHE_SIZE)
+
+
+def available():
+    return lex is not None
+
+
+def cache_key(code, language):
+    return hashlib.sha1(code.encode('utf-8')).hexdigest(), language
+
+
+def token_attribute(token):
+    for token_type, attribute in TOKEN_ATTRIBUTES:
+        if token in token_type:
+            return attribute
+    return 'code-block'
+
+
+def get_lexer(code, language):
+    if language:
+        try:
+            return get_lexer_by_name(language, stripnl=False, ensurenl=False)
+        except ClassNotFound:
+            pass
+    try:
+        return guess_lexer(code, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+
+def highlight(code, language=None):
+    """
+    Highlights code, or returns the cached result.
+    :param code: text of the code block
+    :param language: language name or alias known to Pygments, guessed if None
+    :return: list of lines of urwid text markup, as many as code has lines
+    """
+    key = cache_key(code, language)
+    lines = highlighted.get(key)
+    if lines is not None:
+        return lines
+    lexer = get_lexer(code, language) if available() else None
+    if lexer is None:
+        lines = [[('code-block', line)] for line in code.split('\n')]
+    else:
+        lines = [[]]
+        for token, text in lex(code, lexer):
+            attribute = token_attribute(token)
+            for i, part in enumerate(text.split('\n')):
+                if i > 0:
+                    lines.append([])
+                if part:
+                    lines[-1].append((attribute, part))
+        del lines[code.count('\n') + 1:]  # Some lexers end with an extra newline
+    highlighted[key] = lines
+    return lines
+
+
+def cached(code, language=None):
+    """
+    :return: the highlighted code if it was computed already, else None
+    """
+    return highlighted.get(cache_key(code, language))
+
+
+class Highlighter(object):
+    """
+    Worker thread highlighting code blocks one after the other.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, code, language, callback):
+        """
+        Highlights code in the worker thread, then calls callback with the highlighted lines from it.
+        Does nothing when Pygments is not installed.
+        """
+        if not available():
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.work)
+                self.thread.daemon = True
+                self.thread.start()
+        self.jobs.put((code, language, callback))
+
+    def work(self):
+        while True:
+            code, language, callback = self.jobs.get()
+            try:
+                callback(highlight(code, language))
+            except Exception:
+                pass  # The code stays displayed without highlighting
+
+
+highlighter = Highlighter()
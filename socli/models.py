@@ -0,0 +1,156 @@
+"""
+Records for the data socli extracts from Stack Overflow pages.
+They use __slots__ since interactive sessions can hold a lot of them.
+"""
+
+
+def markup_from_json(markup):
+    """
+    Restores the (attribute, text) tuples of urwid text markup that json turned into lists.
+    :param markup: list of lines, each a list of segments, or None
+    """
+    if markup is None:
+        return None
+    return [[tuple(segment) if isinstance(segment, list) else segment for segment in line] for line in markup]
+
+
+class Record(object):
+    """
+    Base class of the records. Fields are the __slots__ of the subclass.
+    Records are mutable, so they compare and hash by identity; compare their fields explicitly.
+    """
+
+    __slots__ = ()
+
+    def to_dict(self):
+        """
+        :return: dict of the fields, suitable for json
+        """
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a record from the output of to_dict. Unknown keys are ignored.
+        :param data: dict of fields
+        """
+        return cls(**dict((field, data[field]) for field in cls.__slots__ if field in data))
+
+
+class SearchHit(Record):
+    """
+    A question found by a search.
+    """
+
+    __slots__ = ('title', 'desc', 'url', 'question_id')
+
+    def __init__(self, title, desc, url, question_id=None):
+        """
+        :param title: title of the question
+        :param desc: excerpt of the question shown by the search engine
+        :param url: full url of the question
+        :param question_id: id of the question, None until known
+        """
+        self.title = title
+        self.desc = desc
+        self.url = url
+        self.question_id = question_id
+
+    def __repr__(self):
+        return "SearchHit({0!r}, {1!r})".format(self.title, self.url)
+
+
+class Answer(Record):
+    """
+    An answer of a question, as parsed from the question page.
+    """
+
+    __slots__ = ('text', 'score', 'accepted', 'author', 'created', 'edited', 'code_blocks', 'markup', 'answer_id')
+
+    def __init__(self, text, score=0, accepted=False, author=None, created=None, edited=None, code_blocks=(),
+                 markup=None, answer_id=None):
+        """
+        :param text: text of the answer
+        :param score: votes of the answer
+        :param accepted: True if this is the accepted answer
+        :param author: display name of the user who answered
+        :param created: date the answer was posted, as shown on the page
+        :param edited: date of the last edit, None if never edited
+        :param code_blocks: tuple of ( language, code ) of the code snippets in the answer,
+                            language is None when unknown
+        :param markup: answer rendered to urwid text markup lines, None to display the plain text
+        :param answer_id: id of the answer, None if the page does not tell
+        """
+        self.text = text
+        self.score = score
+        self.accepted = accepted
+        self.author = author
+        self.created = created
+        self.edited = edited
+        self.code_blocks = tuple(tuple(block) for block in code_blocks)
+        self.markup = markup_from_json(markup)
+        self.answer_id = answer_id
+
+    @property
+    def has_code(self):
+        return len(self.code_blocks) > 0
+
+    def to_dict(self):
+        data = Record.to_dict(self)
+        data['code_blocks'] = [list(block) for block in self.code_blocks]
+        return data
+
+    def __repr__(self):
+        return "Answer(score={0}, accepted={1}, author={2!r})".format(self.score, self.accepted, self.author)
+
+
+class Question(Record):
+    """
+    A question page: the question and its answers.
+    """
+
+    __slots__ = ('title', 'desc', 'stats', 'url', 'answers', 'desc_markup', 'language', 'linked', 'related',
+                 'duplicate_of')
+
+    def __init__(self, title, desc, stats, url, answers=(), desc_markup=None, language=None, linked=(), related=(),
+                 duplicate_of=None):
+        """
+        :param title: title of the question
+        :param desc: text of the question
+        :param stats: one line of votes and other statistics
+        :param url: full url of the question
+        :param answers: list of Answer objects in page order
+        :param desc_markup: question rendered to urwid text markup lines, None to display the plain text
+        :param language: language of the code in the question, from the page or its tags
+        :param linked: list of SearchHit objects of the questions linking to this one or linked from it
+        :param related: list of SearchHit objects of the questions Stack Overflow lists as related
+        :param duplicate_of: url of the question this one was closed as a duplicate of, None if it was not
+        """
+        self.title = title
+        self.desc = desc
+        self.stats = stats
+        self.url = url
+        self.answers = list(answers)
+        self.desc_markup = markup_from_json(desc_markup)
+        self.language = language
+        self.linked = list(linked)
+        self.related = list(related)
+        self.duplicate_of = duplicate_of
+
+    def to_dict(self):
+        data = Record.to_dict(self)
+        data['answers'] = [answer.to_dict() for answer in self.answers]
+        data['linked'] = [hit.to_dict() for hit in self.linked]
+        data['related'] = [hit.to_dict() for hit in self.related]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        question = super(Question, cls).from_dict(data)
+        question.answers = [Answer.from_dict(answer) for answer in question.answers]
+        question.linked = [SearchHit.from_dict(hit) for hit in question.linked]
+        question.related = [SearchHit.from_dict(hit) for hit in question.related]
+        return question
+
+    def __repr__(self):
+        return "Question({0!r}, {1!r})".format(self.title, self.url)
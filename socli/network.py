@@ -0,0 +1,210 @@
+"""
+Request policy shared by every network call of socli.
+
+Every request gets a connect and a read timeout, so that a stalled connection can not
+hang the command line or freeze the interactive mode. GET requests, which are safe to
+repeat, are retried a bounded number of times with a jittered exponential backoff, and
+can be hedged: when a response takes longer than usual, a duplicate request is sent and
+the first response to arrive is used. A rate limiter given with a request is waited on by
+every attempt and duplicate. A 429 response is only retried after the delay the server
+asks for in Retry-After.
+"""
+
+import email.utils
+import random
+import socket
+import threading
+import time
+
+import requests
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}  # Statuses worth retrying a GET for
+TOO_MANY_REQUESTS = 429
+MAX_RETRY_AFTER = 30  # Longest Retry-After waited for, in seconds, before giving up on a 429
+RETRY_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+class RequestPolicy(object):
+    """
+    Timeouts, retries and hedging of the requests.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=30, retries=2, backoff=0.5, hedge_after=None):
+        """
+        :param connect_timeout: seconds to wait for a connection to be established
+        :param read_timeout: seconds to wait for the server between bytes of the response
+        :param retries: number of times a failed GET is tried again
+        :param backoff: seconds of the first retry delay, doubled for every next retry
+        :param hedge_after: seconds after which a duplicate GET is sent if no response arrived, None to never
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+    def delay(self, attempt):
+        """
+        :param attempt: number of the retry, starting at 1
+        :return: seconds to wait before it, random up to the exponential backoff so that
+                 clients failing together do not retry together
+        """
+        return random.uniform(0, self.backoff * 2 ** (attempt - 1))
+
+    def get(self, session, url, limiter=None, **kwargs):
+        """
+        GET request, retried on connection errors, timeouts and server errors.
+        A 429 response is retried only if it says when, in Retry-After, and that is soon enough.
+        :param session: requests.Session to send the request with
+        :param url: url to get
+        :param limiter: RateLimiter waited on before every request sent, None to send them right away
+        :param kwargs: arguments of requests.Session.get
+        :return: requests.Response, the last one if all attempts failed with an error status
+        """
+        attempt = 0
+        while True:
+            delay = None
+            try:
+                if self.hedge_after is not None:
+                    response = self.hedged_get(session, url, limiter, kwargs)
+                else:
+                    if limiter is not None:
+                        limiter.wait()
+                    response = session.get(url, timeout=self.timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+                if response.status_code == TOO_MANY_REQUESTS:
+                    delay = retry_after(response)
+                    if delay is None or delay > MAX_RETRY_AFTER:
+                        return response
+            except RETRY_ERRORS:
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+            time.sleep(self.delay(attempt) if delay is None else delay)
+
+    def hedged_get(self, session, url, limiter, kwargs):
+        """
+        GET request duplicated when it takes longer than hedge_after seconds.
+        :return: the first response to arrive. Raises the error of the first request if both failed.
+        """
+        results = queue.Queue()
+
+        def request():
+            try:
+                if limiter is not None:
+                    limiter.wait()
+                results.put((session.get(url, timeout=self.timeout, **kwargs), None))
+            except Exception as e:
+                results.put((None, e))
+
+        def start():
+            worker = threading.Thread(target=request)
+            worker.daemon = True
+            worker.start()
+
+        start()
+        try:
+            response, error = results.get(timeout=self.hedge_after)
+            hedged = False
+        except queue.Empty:
+            start()
+            response, error = results.get()
+            hedged = True
+        if error is not None and hedged:
+            other_response, other_error = results.get()
+            if other_error is None:
+                return other_response
+        if error is not None:
+            raise error
+        return response
+
+    def post(self, session, url, **kwargs):
+        """
+        POST request, with the timeouts but never repeated.
+        """
+        return session.post(url, timeout=self.timeout, **kwargs)
+
+
+def retry_after(response):
+    """
+    :param response: requests.Response
+    :return: seconds to wait given by its Retry-After header, None if there is none or it can not be read
+    """
+    value = response.headers.get('Retry-After', '').strip()
+    if value.isdigit():
+        return int(value)
+    parsed = email.utils.parsedate_tz(value) if value else None
+    if parsed is None:
+        return None
+    return max(0, email.utils.mktime_tz(parsed) - time.time())
+
+
+class RateLimiter(object):
+    """
+    Spaces out requests to at most rate per second on average, allowing bursts of burst requests.
+    Safe to share between threads: each caller reserves its slot, then waits for it.
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        :param rate: requests per second
+        :param burst: requests that can be sent at once after a pause
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """ Returns once the caller can send a request. """
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+policy = RequestPolicy()
+
+
+def configure(**settings):
+    """
+    Changes the policy of all the requests made from now on.
+    Libraries opening their own connections, like the Stack Exchange API client,
+    get the read timeout as the default socket timeout.
+    :param settings: arguments of RequestPolicy to change, None values are ignored
+    """
+    for name, value in settings.items():
+        if value is not None:
+            if not hasattr(policy, name):
+                raise TypeError("Unknown request setting: " + name)
+            setattr(policy, name, value)
+    socket.setdefaulttimeout(policy.read_timeout)
+
+
+def get(session, url, **kwargs):
+    """
+    GET request following the policy, see RequestPolicy.get.
+    """
+    return policy.get(session, url, **kwargs)
+
+
+def post(session, url, **kwargs):
+    """
+    POST request following the policy, see RequestPolicy.post.
+    """
+    return policy.post(session, url, **kwargs)
@@ -0,0 +1,190 @@
+"""
+Quota aware access to the Stack Exchange API.
+
+The API allows a daily number of requests per application key (or per IP address
+without a key) and may ask clients to back off from a method for some seconds.
+Both are read from every response and kept in a file shared by all socli processes.
+"""
+
+import threading
+import time
+
+import stackexchange
+
+from .store import JSONStore, user_data_path
+
+QUOTA_FILE_PATH = user_data_path('quota.json')
+DAY = 24 * 60 * 60
+MAX_BACKOFF_WAIT = 60  # Longer backoffs are reported instead of waited for
+
+
+class QuotaExceededError(Exception):
+    """
+    Raised instead of calling the API when the daily quota is known to be used up.
+    """
+
+    def __init__(self, reset_in):
+        """
+        :param reset_in: seconds until the quota is reset
+        """
+        Exception.__init__(self, "Stack Exchange API quota used up, it resets in %d minutes" % (reset_in // 60 + 1))
+        self.reset_in = reset_in
+
+
+class BackoffError(Exception):
+    """
+    Raised instead of calling the API when it asked to back off from a method for longer than MAX_BACKOFF_WAIT.
+    """
+
+    def __init__(self, wait):
+        """
+        :param wait: seconds until the backoff ends
+        """
+        Exception.__init__(self, "Stack Exchange API asked to wait %d seconds before the next request" % (wait + 1))
+        self.wait = wait
+
+
+class QuotaTracker(object):
+    """
+    Remaining quota and backoffs per application key, persisted in a JSONStore.
+    The quota is reset by Stack Exchange at midnight UTC.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def today():
+        return int(time.time() // DAY)
+
+    def state(self, app_key):
+        """
+        :param app_key: API key, None for anonymous requests
+        :return: dict with quota_remaining, quota_max and backoff (method => time it ends)
+        """
+        state = self.store.load().get(app_key or 'anonymous', {})
+        if state.get('day') != self.today():
+            state = {'day': self.today(), 'backoff': state.get('backoff', {})}
+        return state
+
+    def check(self, app_key, method):
+        """
+        Waits for a backoff on method to end. Raises QuotaExceededError when there is no quota left,
+        and BackoffError when the backoff ends after MAX_BACKOFF_WAIT seconds.
+        :param app_key: API key, None for anonymous requests
+        :param method: API method, like 'users/{ids}'
+        """
+        state = self.state(app_key)
+        if state.get('quota_remaining') == 0:
+            raise QuotaExceededError(DAY - time.time() % DAY)
+        wait = state['backoff'].get(method, 0) - time.time()
+        if wait > MAX_BACKOFF_WAIT:
+            raise BackoffError(wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, app_key, method, response):
+        """
+        Stores the quota and backoff sent with an API response.
+        :param response: decoded json of the response
+        """
+        if 'quota_remaining' not in response and 'backoff' not in response:
+            return
+        state = self.state(app_key)
+        for key in ('quota_remaining', 'quota_max'):
+            if key in response:
+                state[key] = response[key]
+        now = time.time()
+        state['backoff'] = dict((m, end) for m, end in state['backoff'].items() if end > now)
+        if 'backoff' in response:
+            state['backoff'][method] = now + response['backoff']
+        self.store.update({app_key or 'anonymous': state})
+
+
+class Coalescer(object):
+    """
+    Runs identical calls made at the same time from several threads only once.
+    The threads arriving while a call is running wait for it and share its result.
+    """
+
+    class Call(object):
+        __slots__ = ('done', 'result', 'error')
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def call(self, key, func):
+        """
+        :param key: hashable identity of the call
+        :param func: function doing the call
+        :return: what func returned
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            running = call is not None
+            if not running:
+                call = self.calls[key] = self.Call()
+        if running:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+tracker = QuotaTracker(JSONStore(QUOTA_FILE_PATH))
+coalescer = Coalescer()
+
+
+class Site(stackexchange.Site):
+    """
+    stackexchange.Site that honors the quota and backoffs sent by the API,
+    and shares identical requests running at the same time.
+    """
+
+    def _request(self, to, params):
+        method = '/'.join('{id}' if part.replace(';', '').isdigit() else part for part in to.split('/'))
+        key = (self.root_domain, self.app_key, to, tuple(sorted((k, str(v)) for k, v in params.items())))
+        tracker.check(self.app_key, method)
+
+        def request():
+            response = stackexchange.Site._request(self, to, dict(params))
+            tracker.record(self.app_key, method, response)
+            return response
+
+        return coalescer.call(key, request)
+
+    def fetch(self, to, **params):
+        """
+        Calls an API method directly, for data the wrapper classes do not expose.
+        :param to: API method with its ids filled in, like 'questions/11227809/answers'
+        :param params: parameters of the method
+        :return: decoded json of the response
+        """
+        return self._request(to, params)
+
+
+def remaining(app_key=None):
+    """
+    :param app_key: API key, None for anonymous requests
+    :return: (quota_remaining, quota_max) as last reported today, None if unknown
+    """
+    state = tracker.state(app_key)
+    if 'quota_remaining' not in state:
+        return None
+    return state['quota_remaining'], state.get('quota_max')
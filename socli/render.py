@@ -0,0 +1,210 @@
+"""
+Conversion of Stack Overflow posts to urwid text markup.
+
+A post is walked once, and turned into a list of lines. Each line is a list of
+segments, either plain text or (attribute, text) tuples using the attributes of
+the palette: 'code-block' for code blocks, 'code' for inline code, 'link' and
+'less-important' for links, 'emphasis' and 'strong' for emphasis, and 'heading'
+for headings.
+"""
+
+import re
+
+from bs4 import Comment, NavigableString, Tag
+
+BLOCK_TAGS = {'p', 'div', 'pre', 'ul', 'ol', 'li', 'blockquote', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+              'hr', 'table', 'tr', 'dl', 'dt', 'dd'}
+INLINE_ATTRIBUTES = {'em': 'emphasis', 'i': 'emphasis', 'strong': 'strong', 'b': 'strong',
+                     'code': 'code', 'kbd': 'code', 'a': 'link'}
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+_whitespace_re = re.compile(r'\s+')
+text_type = type(u'')  # unicode on Python 2, where str() of non-ASCII text fails
+
+
+class PostRenderer(object):
+    """
+    Renders the html of one post. Use render_post instead of this class directly.
+    """
+
+    def __init__(self):
+        self.lines = [[]]
+        self.prefixes = []  # Text starting every line, for lists and quotes
+        self.attributes = [None]
+        self.in_pre = False
+
+    def render(self, post):
+        self.walk(post)
+        lines = self.lines
+        while lines and not lines[-1]:
+            lines.pop()
+        while lines and not lines[0]:
+            lines.pop(0)
+        return lines
+
+    def newline(self):
+        self.lines.append([])
+
+    def end_block(self):
+        """ Makes the next text start a new paragraph, with an empty line in between. """
+        if self.lines[-1] and self.lines[-1] != self.prefix_segments():
+            self.newline()
+        if len(self.lines) > 1 and self.lines[-2] and self.lines[-2] != self.prefix_segments():
+            self.newline()
+
+    def prefix_segments(self):
+        if not self.prefixes:
+            return []
+        return [('less-important', ''.join(self.prefixes))]
+
+    def write(self, text, attribute=None):
+        if not text and not self.in_pre:
+            return
+        line = self.lines[-1]
+        if not line:
+            line.extend(self.prefix_segments())
+            if not self.in_pre:
+                text = text.lstrip()
+                if not text:
+                    return
+        attribute = attribute or self.attributes[-1]
+        if line:
+            last_attribute, last_text = line[-1] if isinstance(line[-1], tuple) else (None, line[-1])
+            if last_attribute == attribute:
+                # Extend the last segment instead of adding one with the same attribute
+                line.pop()
+                text = last_text + text
+        line.append((attribute, text) if attribute else text)
+
+    def walk(self, tag):
+        for child in tag.children:
+            if isinstance(child, Comment):
+                continue
+            if isinstance(child, NavigableString):
+                self.text(text_type(child))  # A plain string, which does not keep the soup alive
+            elif isinstance(child, Tag):
+                self.element(child)
+
+    def text(self, text):
+        if self.in_pre:
+            for i, part in enumerate(text.split('\n')):
+                if i > 0:
+                    self.newline()
+                self.write(part)
+        else:
+            self.write(_whitespace_re.sub(' ', text))
+
+    def element(self, tag):
+        name = tag.name
+        if name == 'br':
+            self.newline()
+        elif name == 'hr':
+            self.end_block()
+            self.write('-' * 20, 'less-important')
+            self.end_block()
+        elif name == 'img':
+            self.write(u'[image: {0}]'.format(tag.get('alt') or tag.get('src', '')), 'less-important')
+        elif name == 'pre':
+            self.end_block()
+            self.pre(tag)
+            self.end_block()
+        elif name in ('ul', 'ol'):
+            self.end_block()
+            for number, item in enumerate(tag.find_all('li', recursive=False), 1):
+                if self.lines[-1]:
+                    self.newline()
+                bullet = u'{0}. '.format(number) if name == 'ol' else '* '
+                self.write(bullet, 'less-important')
+                self.prefixes.append(' ' * len(bullet))
+                self.walk(item)
+                self.prefixes.pop()
+            self.end_block()
+        elif name == 'blockquote':
+            self.end_block()
+            self.prefixes.append('> ')
+            self.walk(tag)
+            self.prefixes.pop()
+            self.end_block()
+        elif name in HEADING_TAGS:
+            self.end_block()
+            self.attributes.append('heading')
+            self.walk(tag)
+            self.attributes.pop()
+            self.end_block()
+        elif name in INLINE_ATTRIBUTES:
+            self.attributes.append(INLINE_ATTRIBUTES[name])
+            self.walk(tag)
+            self.attributes.pop()
+            href = tag.get('href') if name == 'a' else None
+            if href and href != tag.get_text():
+                self.write(u' [{0}]'.format(href), 'less-important')
+        elif name in BLOCK_TAGS:
+            self.end_block()
+            self.walk(tag)
+            self.end_block()
+        else:
+            self.walk(tag)
+
+    def pre(self, tag):
+        """ Code block, kept line by line with its indentation. """
+        self.in_pre = True
+        self.attributes.append('code-block')
+        self.text(tag.get_text().rstrip('\n'))
+        self.attributes.pop()
+        self.in_pre = False
+
+
+def render_post(post):
+    """
+    Converts the html of a post to urwid text markup.
+    :param post: BeautifulSoup tag of the post body
+    :return: list of lines, each a list of segments
+    """
+    return PostRenderer().render(post)
+
+
+def split_code_line(line):
+    """
+    Tells whether a line of markup is part of a code block.
+    :param line: list of segments
+    :return: tuple of ( prefix segments, code text ), code text is None if the line is not code
+    """
+    prefix = []
+    for i, segment in enumerate(line):
+        if isinstance(segment, tuple) and segment[0] == 'code-block':
+            if all(isinstance(s, tuple) and s[0] == 'code-block' for s in line[i:]):
+                return prefix, ''.join(s[1] for s in line[i:])
+            break
+        if not (isinstance(segment, tuple) and segment[0] == 'less-important'):
+            break
+        prefix.append(segment)
+    return line, None
+
+
+def split_code_blocks(lines):
+    """
+    Splits lines of markup into code blocks and runs of other lines.
+    :param lines: list of lines of markup, from render_post
+    :return: list of tuples of ( code, lines ). For a code block, code is its text and lines
+             are ( prefix segments, code line ) tuples. Otherwise code is None and lines are markup.
+    """
+    chunks = []
+    for line in lines:
+        prefix, code = split_code_line(line)
+        is_code = code is not None
+        if not chunks or (chunks[-1][0] is not None) != is_code:
+            chunks.append(['' if is_code else None, []])
+        chunks[-1][1].append((prefix, code) if is_code else line)
+    for chunk in chunks:
+        if chunk[0] is not None:
+            chunk[0] = '\n'.join(code for _, code in chunk[1])
+    return [tuple(chunk) for chunk in chunks]
+
+
+def markup_text(lines):
+    """
+    Plain text of rendered markup, links included.
+    :param lines: output of render_post
+    :return: string
+    """
+    return '\n'.join(''.join(segment[1] if isinstance(segment, tuple) else segment for segment in line)
+                     for line in lines)
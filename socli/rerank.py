@@ -0,0 +1,99 @@
+"""
+Re-ranking of search results by their similarity to the query.
+
+Search engines often rank the best thread a few places down. Results are scored by the
+TF-IDF cosine similarity of their title and excerpt to the query, combined with their
+original rank, which still carries the engine's signal. The term vectors of the results
+are cached, so ranking the same results again only costs the query.
+NumPy computes the scores when it is installed, plain Python otherwise.
+"""
+
+import math
+import re
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .cache import LRUCache
+
+TITLE_WEIGHT = 2  # Times a title term counts compared to an excerpt term
+RANK_WEIGHT = 0.3  # Share of the original rank in the final score
+VECTOR_CACHE_SIZE = 1000  # Number of term vectors kept
+
+STOP_WORDS = frozenset('a an and are as at be by can do does for from how i in is it of on or so the to what '
+                       'when where which why with you'.split())
+_term_re = re.compile(r"[a-z0-9_#+]+(?:\.[a-z0-9_#+]+)*")  # Keeps c++, c# and node.js whole
+
+term_vectors = LRUCache(VECTOR_CACHE_SIZE)
+
+
+def terms(text):
+    """
+    :param text: string
+    :return: list of the lowercase terms of text, without stop words
+    """
+    return [term for term in _term_re.findall(text.lower()) if term not in STOP_WORDS]
+
+
+def term_vector(hit):
+    """
+    :param hit: SearchHit object
+    :return: Counter of the terms of its title and excerpt, title terms counting TITLE_WEIGHT times
+    """
+    key = (hit.title, hit.desc)
+    vector = term_vectors.get(key)
+    if vector is None:
+        vector = Counter(terms(hit.desc))
+        for term in terms(hit.title):
+            vector[term] += TITLE_WEIGHT
+        term_vectors[key] = vector
+    return vector
+
+
+def similarities(query_terms, vectors):
+    """
+    :param query_terms: list of the terms of the query
+    :param vectors: list of term Counters of the results
+    :return: list of the cosine similarities of the TF-IDF vectors of the results to the query's
+    """
+    vocabulary = sorted(set(query_terms).union(*vectors))
+    if not vocabulary:
+        return [0.0] * len(vectors)
+    count = len(vectors)
+    document_frequency = Counter(term for vector in vectors for term in vector)
+    idf = [math.log((1.0 + count) / (1.0 + document_frequency[term])) + 1 for term in vocabulary]
+    query_vector = Counter(query_terms)
+    if numpy is not None:
+        idf = numpy.array(idf)
+        matrix = numpy.array([[vector[term] for term in vocabulary] for vector in vectors], dtype=float) * idf
+        query_row = numpy.array([query_vector[term] for term in vocabulary], dtype=float) * idf
+        norms = numpy.linalg.norm(matrix, axis=1) * numpy.linalg.norm(query_row)
+        norms[norms == 0] = 1
+        return [float(score) for score in matrix.dot(query_row) / norms]
+    query_row = [query_vector[term] * weight for term, weight in zip(vocabulary, idf)]
+    query_norm = math.sqrt(sum(value * value for value in query_row))
+    scores = []
+    for vector in vectors:
+        row = [vector[term] * weight for term, weight in zip(vocabulary, idf)]
+        norm = math.sqrt(sum(value * value for value in row)) * query_norm
+        scores.append(sum(a * b for a, b in zip(row, query_row)) / norm if norm else 0.0)
+    return scores
+
+
+def rerank(query, hits):
+    """
+    Orders search results by relevance to the query.
+    :param query: query text
+    :param hits: list of SearchHit objects in the order of the search engine
+    :return: new list of the same SearchHit objects, most relevant first
+    """
+    if len(hits) < 2:
+        return list(hits)
+    scores = similarities(terms(query), [term_vector(hit) for hit in hits])
+    ranked = [((1 - RANK_WEIGHT) * score + RANK_WEIGHT / (1.0 + position), -position, hit)
+              for position, (score, hit) in enumerate(zip(scores, hits))]
+    ranked.sort(key=lambda entry: entry[:2], reverse=True)
+    return [hit for _, _, hit in ranked]
@@ -0,0 +1,181 @@
+"""
+Registry of the Stack Exchange sites socli can search and read.
+
+Every site has its own pooled session, disk caches and rate limiter. Searches of several
+sites at once do not wait for each other's connections, cached pages of different sites
+are kept apart, and a burst of requests to one site does not slow down the others.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from . import network
+from .auth import POOL_SIZE, get_session
+from .cache import DiskCache
+from .store import JSONStore, user_data_path
+
+DEFAULT_SITE = 'stackoverflow'  # Name of the site searched when none is given
+SITE_RATE = 10  # Requests per second sent to one site
+SITE_BURST = 10  # Requests sent to one site at once after a pause
+DUPLICATES_SIZE = 10000  # Questions kept in the index of duplicates of a site, the oldest are dropped
+
+_host_re = re.compile(r"^(?:https?://)?(?:www\.)?([^/?#:]+)")
+
+
+class Site(object):
+    """
+    A Stack Exchange site, and the connections, caches and rate limit of the requests sent to it.
+    """
+
+    def __init__(self, name, host, title):
+        """
+        :param name: short name of the site, used on the command line
+        :param host: host name of the site
+        :param title: name of the site, as it ends the titles of its pages
+        """
+        self.name = name
+        self.host = host
+        self.title = title
+        self.url = "https://" + host
+        self.limiter = network.RateLimiter(SITE_RATE, SITE_BURST)
+        self.lock = threading.Lock()
+        self._session = None
+        # Stack Overflow keeps the cache directories it had before other sites were supported
+        directory = "cache" if name == DEFAULT_SITE else os.path.join("cache", "sites", name)
+        self.page_cache = DiskCache(user_data_path(os.path.join(directory, "pages")))  # Search result pages
+        self.question_cache = DiskCache(user_data_path(os.path.join(directory, "questions")))  # Parsed questions
+        # Url of a question => [ url of the question it was closed as a duplicate of, time recorded ]
+        self.duplicates = JSONStore(user_data_path(os.path.join(directory, "duplicates.json")))
+
+    def session(self):
+        """
+        :return: requests.Session of the site. Stack Overflow uses the session holding the login cookies.
+        """
+        if self.name == DEFAULT_SITE:
+            return get_session()
+        with self.lock:
+            if self._session is None:
+                session = Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def get(self, url, **kwargs):
+        """
+        GET request following the request policy. Every attempt waits for the rate limit of the site.
+        :param url: url to get, on this site or a search engine
+        :param kwargs: arguments of requests.Session.get
+        :return: requests.Response
+        """
+        return network.get(self.session(), url, limiter=self.limiter, **kwargs)
+
+    def duplicate_of(self, url):
+        """
+        :param url: url of a question of the site
+        :return: url of the question it was closed as a duplicate of, None if it is not a known duplicate
+        """
+        entry = self.duplicates.get(url)
+        return entry[0] if entry else None
+
+    def record_duplicate_of(self, url, original):
+        """
+        Records that a question was closed as a duplicate, or forgets it when original is None.
+        The file is only written when this changes what is known.
+        """
+        if self.duplicate_of(url) == original:
+            return
+
+        def change(index):
+            if original is None:
+                index.pop(url, None)
+                return
+            index[url] = [original, time.time()]
+            if len(index) > DUPLICATES_SIZE:
+                for key in sorted(index, key=lambda key: index[key][1])[:len(index) - DUPLICATES_SIZE]:
+                    del index[key]
+
+        self.duplicates.modify(change)
+
+    def __repr__(self):
+        return "Site({0!r}, {1!r})".format(self.name, self.host)
+
+
+sites = OrderedDict((site.name, site) for site in [
+    Site('stackoverflow', 'stackoverflow.com', 'Stack Overflow'),
+    Site('serverfault', 'serverfault.com', 'Server Fault'),
+    Site('superuser', 'superuser.com', 'Super User'),
+    Site('unix', 'unix.stackexchange.com', 'Unix & Linux Stack Exchange'),
+    Site('askubuntu', 'askubuntu.com', 'Ask Ubuntu'),
+])
+sites_lock = threading.Lock()
+
+
+def get(name):
+    """
+    :param name: name or host of a site
+    :return: Site object. Raises KeyError for an unknown site.
+    """
+    if name in sites:
+        return sites[name]
+    for site in list(sites.values()):
+        if site.host == name:
+            return site
+    raise KeyError(name)
+
+
+def default():
+    return sites[DEFAULT_SITE]
+
+
+def for_url(url):
+    """
+    Site a url belongs to. Sites of stackexchange.com missing from the registry are added on first use.
+    :param url: url of a page
+    :return: Site object, None if the url is not on a Stack Exchange site
+    """
+    match = _host_re.match(url)
+    if match is None:
+        return None
+    host = match.group(1).lower()
+    try:
+        return get(host)
+    except KeyError:
+        pass
+    if not host.endswith(".stackexchange.com"):
+        return None
+    with sites_lock:
+        name = host.split(".")[0]
+        if name not in sites:
+            sites[name] = Site(name, host, name.capitalize() + " Stack Exchange")
+        return sites[name]
+
+
+def names(values):
+    """
+    Parses the sites given on the command line.
+    :param values: list of site names or hosts, a value can hold several separated by commas.
+                   Hosts of stackexchange.com missing from the registry are added.
+    :return: tuple of site names, without repetitions. Raises KeyError for an unknown site.
+    """
+    result = []
+    for value in values:
+        for name in value.split(','):
+            name = name.strip()
+            if name:
+                try:
+                    site = get(name)
+                except KeyError:
+                    site = for_url(name)
+                    if site is None:
+                        raise
+                if site.name not in result:
+                    result.append(site.name)
+    return tuple(result)
@@ -15,36 +15,73 @@ import urwid
 from bs4 import BeautifulSoup
 import random
 import re
+import shutil
 import subprocess
 import textwrap
-from .auth import login_prompt, login, logout
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from .auth import get_session, login_prompt, login, logout
+from . import cluster, highlight, network, rerank, sites
+from .cache import LRUCache
+from .models import Answer, Question, SearchHit
+from .render import markup_text, render_post, split_code_blocks
+from .store import JSONStore, user_data_path
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 try:
     import simplejson as json
 except ImportError:
     import json
-try:
-    JSONDecodeError = json.JSONDecodeError
-except AttributeError:
-    JSONDecodeError = ValueError
 
 
 # Global vars:
 DEBUG = False  # Set True for enabling debugging
-soqurl = "http://stackoverflow.com/search?q="  # Query url
 sourl = "http://stackoverflow.com"  # Site url
-tag = ""  # tag based search
 app_data = dict()  # Data file dictionary
-data_file = os.path.join(os.path.dirname(__file__), "data.json")  # Data file location
+data_file = user_data_path("data.json")  # Data file location
+data_store = JSONStore(data_file, legacy_path=os.path.join(os.path.dirname(__file__), "data.json"))
 query = ""  # Query
 uas = []  # User agent list
 header = {}  # Request header
-google_search = True # Uses google search. Enabled by default.
-google_search_url = "https://www.google.com/search?q=site:stackoverflow.com+" #Google search query URL
+google_search_url = "https://www.google.com/search?q=" #Google search query URL, followed by site:host
 question_post = None #Used to see whether we are currently displaying a question post
 question_page = None #Not None only if in interactive mode. Displays all the questions found.
 header_for_display = None #Used as header to display question post
+answer_questions = {} #(host, answer id) => question id, learnt from the question pages fetched
 LOOP = None #Main Loop used to render widgets
+main_loop_calls = deque() #Functions queued by other threads to run in the main loop
+QUESTION_CACHE_SIZE = 50 #Number of parsed questions kept in interactive mode
+WIDGET_CACHE_BYTES = 32 * 1024 * 1024 #Estimated bytes of the widgets of answers kept in interactive mode
+WIDGET_BYTES = 600 #Estimated bytes of a text widget, besides its text
+MEM_STATS = False #Set True to show the memory used by interactive mode
+SEARCH_CACHE_SIZE = 50 #Number of search result pages kept
+SEARCH_MAX_AGE = 6 * 60 * 60 #Seconds search result pages are reused from the disk cache
+QUESTION_MAX_AGE = 24 * 60 * 60 #Seconds parsed questions are reused from the disk cache
+EXPORT_WORKERS = 4 #Number of questions fetched at the same time by --export
+EXPORT_SEEN_PAGES = 2 #Result pages whose threads --export does not write again, for results shifting between pages
+WARM_WORKERS = 4 #Number of pages fetched at the same time by --warm
+WARM_RATE = 1 #Requests per second sent by --warm
+WARM_RESULTS = 3 #Questions cached for every query by --warm
+WARM_ENTRIES = 100 #Most recent distinct entries of the file read by --warm
+TERMINAL_SIZE = (24, 80) #Rows and columns assumed when the size of the terminal can not be found
+RELATED_PREFETCH = 5 #Linked and related questions of a question page fetched while it is read
+RELATED_RATE = 0.5 #Requests per second of that prefetch, low to leave the bandwidth to the user
+related_limiter = network.RateLimiter(RELATED_RATE) #Shared by the prefetches of linked and related questions
+RERANK = False #Set True to order search results by their similarity to the query
+COLLAPSE_SIMILAR = False #Set True to also hide search results nearly identical to an earlier one
+
+#Precompiled url patterns
+question_url_re = re.compile(r"/q(?:uestions)?/([0-9]+)")
+answer_url_re = re.compile(r"\.com/a/([0-9]+)")
+#Groups: host, question id, title slug, short question id (of /q/ links), answer id. Only one of the ids is set.
+thread_url_re = re.compile(r"^(?:https?://)?(?:www\.)?([^/?#]+)/(?:questions/([0-9]+)(/[^/?#]*)?|q/([0-9]+)|a/([0-9]+))")
+google_captcha_re = re.compile(r"ipv4\.google\.com/sorry")
+so_captcha_re = re.compile(r"\.com/nocaptcha")
+duplicate_notice_re = re.compile(r"already has (?:an )?answers? here|marked as (?:a )?duplicate", re.I)
 
 #Palette for question post colors
 palette = [('answer', 'default', 'default'),
@@ -52,9 +89,24 @@ palette = [('answer', 'default', 'default'),
            ('heading', 'light green, bold', 'default'),
            ('metadata', 'dark green', 'default'),
            ('less-important', 'dark gray', 'default'),
-           ('warning', 'yellow', 'default')
+           ('warning', 'yellow', 'default'),
+           ('code', 'light cyan', 'default'),
+           ('code-block', 'light cyan', 'default'),
+           ('code-keyword', 'yellow', 'default'),
+           ('code-name', 'light green', 'default'),
+           ('code-string', 'light magenta', 'default'),
+           ('code-number', 'light red', 'default'),
+           ('code-comment', 'dark gray', 'default'),
+           ('link', 'light blue', 'default'),
+           ('emphasis', 'default, italics', 'default'),
+           ('strong', 'default, bold', 'default'),
+           ('selected', 'white', 'dark gray'),
+           ('selected-warning', 'yellow', 'dark gray')
            ]
 
+#Attributes of the question list item under the cursor
+focus_map = {None: 'selected', 'warning': 'selected-warning'}
+
 # Suppressing InsecureRequestWarning and many others
 requests.packages.urllib3.disable_warnings()
 
@@ -109,6 +161,25 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+def terminal_size():
+    """
+    Size of the terminal, read from the screen of the main loop when it runs. Works without
+    a terminal, e.g. when the output is redirected.
+    :return: tuple of ( rows, columns ), TERMINAL_SIZE if it can not be found
+    """
+    if LOOP is not None:
+        columns, rows = LOOP.screen.get_cols_rows()
+        return rows, columns
+    if hasattr(shutil, 'get_terminal_size'):
+        columns, rows = shutil.get_terminal_size((TERMINAL_SIZE[1], TERMINAL_SIZE[0]))
+        return rows, columns
+    try:
+        with open(os.devnull, 'w') as devnull:
+            rows, columns = subprocess.check_output(['stty', 'size'], stderr=devnull).split()
+        return int(rows), int(columns)
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return TERMINAL_SIZE
+
 class UnicodeText(urwid.Text):
     """ encode all text to utf-8 """
 
@@ -131,11 +202,18 @@ class UnicodeText(urwid.Text):
 
 class Header(UnicodeText):
     """
-    Header of the question page. Event messages are recorded here.
+    Header of the question list and question page. Event messages are recorded here,
+    and downloads in progress are shown with a spinner.
     """
 
+    SPINNER = '|/-\\'
+    SPIN_INTERVAL = 0.2  # Seconds between two frames of the spinner
+
     def __init__(self):
         self.current_event = None
+        self.loading_message = None
+        self.frame = 0  # Frame of the spinner shown
+        self.alarm = None
         UnicodeText.__init__(self, '')
 
     def event(self, event, message):
@@ -144,64 +222,176 @@ class Header(UnicodeText):
 
     def clear(self, event):
         if self.current_event == event:
+            self.current_event = None
             self.set_text('')
 
+    def loading(self, message):
+        """ Shows message with a spinner until the loading event is cleared or replaced. """
+        self.loading_message = message
+        self.event('loading', ('less-important', self.SPINNER[self.frame] + ' ' + message))
+        if LOOP is not None and self.alarm is None:
+            self.alarm = LOOP.set_alarm_in(self.SPIN_INTERVAL, self.spin)
+
+    def spin(self, loop, data):
+        self.alarm = None
+        if self.current_event == 'loading':
+            self.frame = (self.frame + 1) % len(self.SPINNER)
+            self.loading(self.loading_message)
+
+
+class BackgroundFetch(object):
+    """
+    A download run in a background thread, so that the main loop keeps handling keys.
+    The header shows it until it ends. Its result is handed to the main loop, unless it
+    was cancelled meanwhile: the request itself can not be interrupted, it is left to
+    finish and its result is dropped.
+    """
+
+    def __init__(self, fetch, done, message):
+        """
+        :param fetch: function downloading and returning the result, run in the background thread
+        :param done: function called with the result in the main loop
+        :param message: shown in the header during the download
+        """
+        self.fetch = fetch
+        self.done = done
+        self.cancelled = False
+        header_for_display.loading(message)
+        worker = threading.Thread(target=self.run)
+        worker.daemon = True
+        worker.start()
+
+    def run(self):
+        try:
+            result, error = self.fetch(), None
+        except (Exception, SystemExit) as e:
+            result, error = None, e
+        call_in_main_loop(lambda: self.finish(result, error))
+
+    def finish(self, result, error):
+        if self.cancelled:
+            return
+        header_for_display.clear('loading')
+        if error is not None:
+            showerror(error)
+            header_for_display.event('fetch-error', ('warning', 'Download failed. Check your internet '
+                                                                'connectivity and try again.'))
+        else:
+            self.done(result)
+
+    def cancel(self):
+        self.cancelled = True
+        header_for_display.clear('loading')
+
+
+def call_in_main_loop(func):
+    """
+    Runs func in the main loop, where widgets can be changed. Can be called from any thread.
+    Functions queued before the main loop is created run when it starts.
+    :param func: function without arguments
+    """
+    main_loop_calls.append(func)
+    loop = LOOP
+    if loop is not None:
+        os.write(loop.wakeup_pipe, b'.')
+
+
 class EditedMainLoop(urwid.MainLoop):
 
-    def process_input(self, keys):
-        super(EditedMainLoop, self).process_input(keys)
-        global question_post
-        if question_post != None:
-            if 'window resize' in keys:
-                question_post.keypress(question_post, 'window resize')
+    def __init__(self, *args, **kwargs):
+        super(EditedMainLoop, self).__init__(*args, **kwargs)
+        self.wakeup_pipe = self.watch_pipe(self.run_calls)
+
+    def run(self):
+        if main_loop_calls:
+            os.write(self.wakeup_pipe, b'.')
+        super(EditedMainLoop, self).run()
+
+    def run_calls(self, data):
+        """ Runs the functions queued by call_in_main_loop. """
+        while main_loop_calls:
+            main_loop_calls.popleft()()
+        return True
+
 
 class QuestionPage(urwid.WidgetWrap):
     """
     Main container for urwid interactive mode.
     """
 
-    def __init__(self, data):
+    def __init__(self, question, previous=None, view=None):
         """
         Construct the Question Page.
-        :param data: tuple of (answers, question_title, question_desc, question_stats, question_url)
+        The linked and related questions start downloading in the background, slowly, so
+        that they open at once if the user follows one.
+        :param question: Question object
+        :param previous: widget to go back to, None for the list of search results
+        :param view: answer, order and filter to show, from AnswerText.get_view of an earlier page of the question
         """
-        answer_frame = self.makeFrame(data)
+        self.previous = previous
+        related = [hit.url for hit in question.linked + question.related]
+        self.prefetcher = QuestionPrefetcher(related[:RELATED_PREFETCH], related_limiter)
+        answer_frame = self.makeFrame(question, view)
         urwid.WidgetWrap.__init__(self, answer_frame)
 
-    def makeFrame(self, data):
+    def makeFrame(self, question, view=None):
         """
         Returns a new frame that is formatted correctly with respect to the window's dimensions.
-        :param data: tuple of (answers, question_title, question_desc, question_stats, question_url)
+        :param question: Question object
+        :param view: see __init__
         :return: a new urwid.Frame object
         """
-        answers, question_title, question_desc, question_stats, question_url = data
-        self.data = data
-        self.question_desc = question_desc
-        self.url = question_url
-        self.answer_text = AnswerText(answers)
-        self.screenHeight, screenWidth = subprocess.check_output(['stty', 'size']).split()
-        self.question_text = urwid.BoxAdapter(QuestionDescription(question_desc), int(max(1, (int(self.screenHeight) - 9) / 2)))
+        self.question = question
+        self.question_desc = question.desc
+        self.url = question.url
+        self.answer_text = AnswerText(question.answers, view)
+        self.screen_rows = terminal_size()[0]
+        self.question_text = urwid.BoxAdapter(QuestionDescription(question), self.question_rows(self.screen_rows))
         answer_frame = urwid.Frame(
             header= urwid.Pile( [
                 header_for_display,
-                QuestionTitle(question_title),
+                QuestionTitle(question.title),
                 self.question_text,
-                QuestionStats(question_stats),
+                QuestionStats(question.stats),
                 urwid.Divider('-')
             ]),
             body=self.answer_text,
             footer= urwid.Pile([
-                QuestionURL(question_url),
-                UnicodeText(u'p: previous answer, n: next answer, o: open in browser, b: back')
+                QuestionURL(question.url),
+                UnicodeText(u'p: previous answer, n: next answer, v: sort by votes, a: accepted answer, '
+                            u'c: answers with code, r: linked and related questions, o: open in browser, b: back')
             ])
         )
         return answer_frame
 
+    @staticmethod
+    def question_rows(screen_rows):
+        """
+        :return: rows of the question text on a screen of screen_rows rows, about half of what the answer leaves
+        """
+        return int(max(1, (screen_rows - 9) / 2))
+
+    def render(self, size, focus=False):
+        # The question takes a share of the rows of the screen, so it is resized with the window.
+        if len(size) == 2 and size[1] != self.screen_rows:
+            self.screen_rows = size[1]
+            self.question_text.height = self.question_rows(self.screen_rows)
+            self.question_text._invalidate()
+        return urwid.WidgetWrap.render(self, size, focus)
+
     def keypress(self, size, key):
         if key in {'down', 'n', 'N'}:
             self.answer_text.next_ans()
         elif key in {'up', 'p', 'P'}:
             self.answer_text.prev_ans()
+        elif key in {'v', 'V'}:
+            self.answer_text.toggle_sort()
+        elif key in {'a', 'A'}:
+            self.answer_text.accepted_ans()
+        elif key in {'c', 'C'}:
+            self.answer_text.toggle_code_only()
+        elif key in {'r', 'R'}:
+            self.show_related()
         elif key in {'o', 'O'}:
             import webbrowser
             if sys.platform.startswith('darwin'):
@@ -214,30 +404,64 @@ class QuestionPage(urwid.WidgetWrap):
             global question_post
             global question_page
             question_post = None
-            if question_page is None:
+            self.prefetcher.cancel()
+            if self.previous is not None:
+                LOOP.widget = self.previous
+            elif question_page is None:
                 sys.exit(0)
             else:
                 LOOP.widget = question_page
-        elif key == 'window resize':
-            screenHeight, screenWidth = subprocess.check_output(['stty', 'size']).split()
-            if self.screenHeight != screenHeight:
-                self._invalidate()
-                answer_frame = self.makeFrame(self.data)
-                urwid.WidgetWrap.__init__(self, answer_frame)
+
+
+    def show_related(self):
+        global question_post
+        if not (self.question.linked or self.question.related):
+            header_for_display.event('related', ('warning', 'No linked or related questions.'))
+            return
+        question_post = None
+        LOOP.widget = RelatedQuestionsPage(self)
+
+    def open_related(self, url, previous):
+        """
+        Displays a linked or related question, from the prefetched ones if it is there.
+        The question is fetched in the background if it is not.
+        :param url: url of the question
+        :param previous: widget to go back to
+        :return: BackgroundFetch object of the question
+        """
+
+        def show(question):
+            global question_post
+            question_post = QuestionPage(question, previous)
+            LOOP.widget = question_post
+
+        return BackgroundFetch(lambda: self.prefetcher.get(url), show, 'Loading question...')
 
 
 class AnswerText(urwid.WidgetWrap):
     """Answers to the question.
 
     Long answers can be navigated up or down using the mouse.
+    Answers can be sorted by votes or filtered to the ones with code. Both work on the
+    answers parsed with the question, nothing is fetched or parsed again.
     """
 
-    def __init__(self, answers):
+    def __init__(self, answers, view=None):
+        """
+        :param answers: list of Answer objects in page order
+        :param view: answer, order and filter to show, from get_view, None for the first answer in page order
+        """
         urwid.WidgetWrap.__init__(self, UnicodeText(''))
         self._selectable = True  # so that we receive keyboard input
         self.answers = answers
+        self.shown = answers  # Answers in the current order and filter
+        self.sort_by_votes = False
+        self.code_only = False
         self.index = 0
-        self.set_answer()
+        if view is not None:
+            self.set_view(view)
+        else:
+            self.set_answer()
 
     def set_answer(self):
         """
@@ -245,9 +469,79 @@ class AnswerText(urwid.WidgetWrap):
         a Pile from the main question page. Scrolling is necessary for long answers which are longer
         than the length of the terminal.
         """
-        self.content = [('less-important', 'Answer: ')] + self.answers[self.index].split("\n")
+        answer = self.shown[self.index]
+        self.content = [UnicodeText(('less-important', 'Answer: ')),
+                        UnicodeText(('metadata', self.answer_stats(answer)))] + answer_widgets(answer)
         self._w = ScrollableTextBox(self.content)
 
+    def get_view(self):
+        """
+        :return: tuple of ( sorted by votes, only answers with code, index of the answer shown in page order )
+        """
+        return self.sort_by_votes, self.code_only, self.answers.index(self.shown[self.index])
+
+    def set_view(self, view):
+        """
+        Shows an answer with the order and filter of the output of get_view.
+        """
+        self.sort_by_votes, self.code_only, index = view
+        self.shown, self.index = [self.answers[index]], 0
+        self.update_view()
+
+    @staticmethod
+    def answer_stats(answer):
+        """ One line summary of the votes, author and dates of an answer """
+        stats = ["Votes " + str(answer.score)]
+        if answer.accepted:
+            stats.append("Accepted")
+        if answer.author:
+            stats.append("By " + answer.author)
+        if answer.created:
+            stats.append("Answered " + answer.created)
+        if answer.edited:
+            stats.append("Edited " + answer.edited)
+        return ' | '.join(stats)
+
+    def update_view(self):
+        """ Applies the current sort order and filter, staying on the same answer if it is still shown. """
+        current = self.shown[self.index]
+        shown = self.answers
+        if self.code_only:
+            shown = [answer for answer in shown if answer.has_code]
+            if not shown:
+                self.code_only = False
+                header_for_display.event('answer-view', ('warning', 'No answers with code.'))
+                return
+        if self.sort_by_votes:
+            shown = sorted(shown, key=lambda answer: answer.score, reverse=True)
+        self.shown = shown
+        self.index = shown.index(current) if current in shown else 0
+        self.set_answer()
+
+    def toggle_sort(self):
+        """sort by votes or go back to page order."""
+        self.sort_by_votes = not self.sort_by_votes
+        header_for_display.event('answer-view', ('warning', 'Sorted by votes.' if self.sort_by_votes
+                                                 else 'Sorted in page order.'))
+        self.update_view()
+
+    def toggle_code_only(self):
+        """show only answers with code, or all answers."""
+        self.code_only = not self.code_only
+        header_for_display.event('answer-view', ('warning', 'Showing answers with code.' if self.code_only
+                                                 else 'Showing all answers.'))
+        self.update_view()
+
+    def accepted_ans(self):
+        """go to the accepted answer."""
+        for i, answer in enumerate(self.shown):
+            if answer.accepted:
+                self.index = i
+                header_for_display.clear('answer-bounds')
+                self.set_answer()
+                return
+        header_for_display.event('answer-bounds', ('warning', 'No accepted answer shown.'))
+
     def prev_ans(self):
         """go to previous answer."""
         self.index -= 1
@@ -261,8 +555,8 @@ class AnswerText(urwid.WidgetWrap):
     def next_ans(self):
         """go to next answer."""
         self.index += 1
-        if self.index > len(self.answers) - 1:
-            self.index = len(self.answers) - 1
+        if self.index > len(self.shown) - 1:
+            self.index = len(self.shown) - 1
             header_for_display.event('answer-bounds', ('warning', 'No more answers.'))
         else:
             header_for_display.clear('answer-bounds')
@@ -272,6 +566,75 @@ class AnswerText(urwid.WidgetWrap):
         """ return number of rows in this widget """
         return len(self.content)
 
+def widgets_size(widgets):
+    """
+    :param widgets: list of text widgets
+    :return: estimate of the bytes they take, measured on urwid text widgets of answers
+    """
+    return sum(WIDGET_BYTES + 4 * len(widget.text) for widget in widgets)
+
+
+rendered_answers = LRUCache(WIDGET_CACHE_BYTES, widgets_size)
+
+
+def answer_widgets(answer):
+    """
+    Text widgets of the lines of an answer. They are kept for the answers displayed last, so that
+    going back to an answer or resizing the window reuses them: urwid only lays out their text
+    again for the new width, nothing is parsed or converted again.
+    The widgets kept are bounded by WIDGET_CACHE_BYTES, the least recently shown are built again when needed.
+    :param answer: Answer object
+    :return: list of UnicodeText
+    """
+    widgets = rendered_answers.get(answer)
+    if widgets is None:
+        if answer.markup is not None:
+            widgets = markup_widgets(answer.markup, dict((code, language) for language, code in answer.code_blocks))
+        else:
+            widgets = [UnicodeText(line) for line in answer.text.split("\n")]
+        rendered_answers[answer] = widgets
+    return widgets
+
+
+def markup_widgets(lines, code_languages=None, language=None):
+    """
+    Text widgets of lines of markup. Code blocks are displayed as they are at first, and
+    highlighted in the background when Pygments is installed.
+    :param lines: list of lines of markup, from render_post
+    :param code_languages: dict of code block text => language
+    :param language: language of the code blocks not in code_languages
+    :return: list of UnicodeText
+    """
+    code_languages = code_languages or {}
+    widgets = []
+    for code, chunk in split_code_blocks(lines):
+        if code is None:
+            widgets.extend(UnicodeText(line or '') for line in chunk)
+            continue
+        block = [(UnicodeText(prefix + [('code-block', code_line)]), prefix) for prefix, code_line in chunk]
+        widgets.extend(widget for widget, _ in block)
+        highlight_block(block, code, code_languages.get(code, language))
+    return widgets
+
+
+def highlight_block(block, code, language):
+    """
+    Shows the highlighted code in the widgets of a code block, right away if it is cached,
+    otherwise once the highlighter thread is done with it.
+    :param block: list of (widget, prefix segments) of the lines of the block
+    """
+
+    def show(highlighted_lines):
+        for (widget, prefix), line in zip(block, highlighted_lines):
+            widget.set_text(UnicodeText.to_unicode(prefix + (line or [('code-block', '')])))
+
+    cached = highlight.cached(code, language)
+    if cached is not None:
+        show(cached)
+    else:
+        highlight.highlighter.submit(code, language, lambda lines: call_in_main_loop(lambda: show(lines)))
+
+
 class ScrollableTextBox(urwid.ListBox):
     """ Display input text, scrolling through when there is not enough room.
 
@@ -280,9 +643,9 @@ class ScrollableTextBox(urwid.ListBox):
 
     def __init__(self, content):
         """
-        :param content: text string to be displayed
+        :param content: list of lines to be displayed, as text markup or widgets
         """
-        lines = [UnicodeText(line) for line in content]
+        lines = [line if isinstance(line, urwid.Widget) else UnicodeText(line) for line in content]
         body = urwid.SimpleFocusListWalker(lines)
         urwid.ListBox.__init__(self, body)
 
@@ -309,6 +672,9 @@ class QuestionDescription(urwid.WidgetWrap):
     """ Description of the question """
 
     def __init__(self, description):
+        """
+        :param description: Question object
+        """
         urwid.WidgetWrap.__init__(self, UnicodeText(''))
         self.description = description
         self.set_description()
@@ -319,7 +685,10 @@ class QuestionDescription(urwid.WidgetWrap):
         a Pile from the main question page. Scrolling is necessary for long questions which are longer
         than the length of the terminal.
         """
-        self.content =  self.description.strip("\n").split("\n")
+        if self.description.desc_markup is not None:
+            self.content = markup_widgets(self.description.desc_markup, language=self.description.language)
+        else:
+            self.content = self.description.desc.strip("\n").split("\n")
         self._w = ScrollableTextBox(self.content)
 
     def __len__(self):
@@ -340,6 +709,255 @@ class QuestionURL(UnicodeText):
         text = ["\n", ('heading', 'Question URL: '), url]
         UnicodeText.__init__(self, text)
 
+class QuestionItem(urwid.WidgetWrap):
+    """ A search result in the question list. Selectable, so it can hold the cursor. """
+
+    def __init__(self, index, question, duplicates=0):
+        """
+        :param index: number of the result
+        :param question: SearchHit object
+        :param duplicates: number of results hidden as duplicates of this one
+        """
+        text = [
+            ("warning", u"{}. {}\n".format(index, question.title)),
+            question.desc + "\n",
+        ]
+        if duplicates:
+            text.insert(2, ("less-important", u"{} duplicate{} hidden\n".format(duplicates, "s" if duplicates > 1 else "")))
+        urwid.WidgetWrap.__init__(self, urwid.AttrMap(UnicodeText(text), None, focus_map=focus_map))
+        self.index = index
+        self.question = question
+        self.duplicates = duplicates
+
+    def selectable(self):
+        return True
+
+    def keypress(self, size, key):
+        return key
+
+
+class SelectQuestionPage(urwid.WidgetWrap):
+    """
+    List of search results for interactive mode.
+
+    The list grows as the user scrolls: when the cursor gets near the bottom, the next page
+    of results is fetched in a background thread while the UI keeps handling keys.
+    The questions opened are kept as parsed data, not as widgets: only the page of the question
+    opened last is kept, the others are built again, at the answer they were left at.
+    """
+
+    LOAD_MARGIN = 3  # Fetch more results when the cursor is this close to the end of the list
+
+    def __init__(self, questions):
+        """
+        :param questions: SearchResults object with at least one result
+        """
+        self.questions = questions
+        self.cachedQuestions = LRUCache(QUESTION_CACHE_SIZE)  # url => Question object
+        self.views = {}  # url => answer shown of a question left, see AnswerText.get_view
+        self.shown = None  # ( url, QuestionPage ) of the question opened last
+        self.fetch = None  # BackgroundFetch of the question being opened
+        self.number = ''  # Digits of the question number being typed
+        self.loading = False
+        self.load_error = None
+        self.walker = urwid.SimpleFocusListWalker([])
+        self.questions_box = urwid.ListBox(self.walker)
+        self.add_questions()
+        urwid.connect_signal(self.walker, 'modified', self.load_more_if_needed)
+        self.header = UnicodeText(('less-important', 'Select a question below:\n'))
+        self.footer = UnicodeText('')
+        self.update_footer()
+        frame = urwid.Frame(header=urwid.Pile([header_for_display, self.header]),
+                            body=self.questions_box,
+                            footer=self.footer)
+        urwid.WidgetWrap.__init__(self, frame)
+
+    # Override parent method
+    def selectable(self):
+        return True
+
+    def add_questions(self):
+        """
+        Adds a list item for every fetched result not displayed yet, and updates the items
+        whose group of duplicates changed.
+        """
+        for i in range(self.questions.loaded()):
+            question = self.questions.results[i]
+            duplicates = len(self.questions.duplicates(i))
+            if i == len(self.walker):
+                self.walker.append(QuestionItem(i, question, duplicates))
+            elif self.walker[i].question is not question or self.walker[i].duplicates != duplicates:
+                self.walker[i] = QuestionItem(i, question, duplicates)
+
+    def update_footer(self, message=None):
+        last = str(len(self.walker) - 1)
+        if message is None:
+            if self.number:
+                message = 'Question number: ' + self.number + ' (enter: select, backspace: erase)'
+            else:
+                message = '0-' + last + ' or enter: select a question, up/down: scroll, any other key: exit.'
+            if self.loading:
+                message += ' Loading more results...'
+            elif self.load_error:
+                message += ' ' + self.load_error
+            if MEM_STATS:
+                message += '\n' + memory_summary(self)
+        self.footer.set_text(UnicodeText.to_unicode(message))
+
+    def keypress(self, size, key):
+        if key in ('0', '1', '2', '3', '4', '5', '6', '7', '8', '9'):
+            self.number += key
+            # Select right away when no longer loaded question number starts with these digits,
+            # which is always the case for 0
+            if self.number == '0' or int(self.number) * 10 >= len(self.walker):
+                self.select_number()
+            else:
+                self.update_footer()
+        elif key == 'backspace' and self.number:
+            self.number = self.number[:-1]
+            self.update_footer()
+        elif key == 'enter':
+            if self.number:
+                self.select_number()
+            else:
+                self.select_question(self.questions_box.focus.index)
+        elif key in {'down', 'up', 'page down', 'page up', 'home', 'end'}:
+            self.number = ''
+            self.questions_box.keypress(size, key)
+            self.update_footer()
+        elif key in {'left', 'b', 'B'} and self.cancel_fetch():
+            pass
+        else:
+            raise urwid.ExitMainLoop()
+
+    def cancel_fetch(self):
+        """
+        Stops waiting for the question being opened, if there is one.
+        :return: True if one was being opened
+        """
+        fetch, self.fetch = self.fetch, None
+        if fetch is None or fetch.cancelled:
+            return False
+        fetch.cancel()
+        return True
+
+    def mouse_event(self, size, event, button, col, row, focus):
+        SCROLL_WHEEL_UP = 4
+        SCROLL_WHEEL_DOWN = 5
+        if button == SCROLL_WHEEL_DOWN:
+            self.questions_box.keypress(size, 'down')
+        elif button == SCROLL_WHEEL_UP:
+            self.questions_box.keypress(size, 'up')
+        else:
+            return self._w.mouse_event(size, event, button, col, row, focus)
+        return True
+
+    def select_number(self):
+        index = int(self.number)
+        self.number = ''
+        if index >= len(self.walker):
+            self.update_footer('Question numbers range from 0-' + str(len(self.walker) - 1) +
+                               ". Please select a valid question number.")
+            return
+        self.questions_box.set_focus(index)
+        self.update_footer()
+        self.select_question(index)
+
+    def select_question(self, index):
+        """
+        Opens a question. A question not cached yet is fetched in the background: the list
+        keeps handling keys, b cancels, and selecting another question replaces it.
+        """
+        url = self.questions.results[index].url
+        if self.shown is not None:
+            shown_url, page = self.shown
+            self.views[shown_url] = page.answer_text.get_view()
+            self.shown = None  # Releases the widgets of the page
+        self.cancel_fetch()
+        question = self.cachedQuestions.get(url)
+        if question is not None:
+            self.show_question(url, question)
+        else:
+            self.fetch = BackgroundFetch(lambda: get_question_stats_and_answer(url),
+                                         lambda question: self.show_question(url, question),
+                                         'Loading question ' + str(index) + '... (b: cancel)')
+
+    def show_question(self, url, question):
+        global question_post
+        self.fetch = None
+        self.cachedQuestions[url] = question
+        question_post = QuestionPage(question, view=self.views.get(url))
+        self.shown = (url, question_post)
+        LOOP.widget = question_post
+
+    def load_more_if_needed(self):
+        """ Starts fetching the next result page when the cursor is near the end of the list. """
+        if self.loading or self.questions.exhausted or LOOP is None:
+            return
+        if self.walker.focus is not None and self.walker.focus < len(self.walker) - self.LOAD_MARGIN:
+            return
+        self.loading = True
+        self.load_error = None
+        self.update_footer()
+        worker = threading.Thread(target=self.load_more)
+        worker.daemon = True
+        worker.start()
+
+    def load_more(self):
+        """ Runs in a background thread. Fetches a page and has the main loop display it. """
+        try:
+            self.questions.next_page()
+        except (Exception, SystemExit) as e:
+            showerror(e)
+            self.load_error = 'Could not load more results.'
+        call_in_main_loop(self.loaded)
+
+    def loaded(self):
+        """ Runs in the main loop once a background fetch is done. """
+        self.add_questions()
+        self.loading = False
+        self.update_footer()
+        self.load_more_if_needed()
+
+
+class RelatedQuestionsPage(SelectQuestionPage):
+    """
+    List of the linked and related questions of a question page.
+    """
+
+    def __init__(self, question_page):
+        """
+        :param question_page: QuestionPage the questions are listed on
+        """
+        self.question_page = question_page
+        question = question_page.question
+        hits = ([SearchHit(hit.title, ' | '.join(filter(None, ['Linked', hit.desc])), hit.url)
+                 for hit in question.linked] +
+                [SearchHit(hit.title, ' | '.join(filter(None, ['Related', hit.desc])), hit.url)
+                 for hit in question.related])
+        results = SearchResults(lambda page: hits if page == 1 else [], collapse=False)
+        results.fetch_all()
+        SelectQuestionPage.__init__(self, results)
+        self.header.set_text(('less-important', 'Linked and related questions of "' + question.title + '":\n'))
+
+    def keypress(self, size, key):
+        if key in {'left', 'b', 'B'} and not self.cancel_fetch():
+            global question_post
+            question_post = self.question_page
+            LOOP.widget = self.question_page
+        else:
+            SelectQuestionPage.keypress(self, size, key)
+
+    def update_footer(self, message=None):
+        if message is None and not self.number:
+            message = '0-' + str(len(self.walker) - 1) + ' or enter: select a question, up/down: scroll, b: back.'
+        SelectQuestionPage.update_footer(self, message)
+
+    def select_question(self, index):
+        self.cancel_fetch()
+        self.fetch = self.question_page.open_related(self.questions.results[index].url, self)
+
+
 def format_str(str, color):
     return "{0}{1}{2}".format(color, str, colorama.Style.RESET_ALL)
 
@@ -400,7 +1018,58 @@ def underline(str):
     return (format_str(str, bcolors.UNDERLINE))
 
 
+#Colors of the palette attributes when printing markup without urwid
+markup_colors = {'code': colorama.Fore.CYAN,
+                 'code-block': colorama.Fore.CYAN,
+                 'code-keyword': colorama.Fore.YELLOW,
+                 'code-name': colorama.Fore.GREEN,
+                 'code-string': colorama.Fore.MAGENTA,
+                 'code-number': colorama.Fore.RED,
+                 'code-comment': colorama.Fore.WHITE + colorama.Style.DIM,
+                 'link': colorama.Fore.BLUE,
+                 'heading': colorama.Fore.GREEN + colorama.Style.BRIGHT,
+                 'emphasis': colorama.Style.BRIGHT,
+                 'strong': colorama.Style.BRIGHT,
+                 'less-important': colorama.Style.DIM}
+
+
+def print_markup(lines, code_languages=None, language=None):
+    """
+    Prints lines of markup with colors. Code blocks are printed highlighted if they were highlighted
+    already, otherwise as they are and highlighted in the background for the next time.
+    :param lines: list of lines of markup, from render_post
+    :param code_languages: dict of code block text => language
+    :param language: language of the code blocks not in code_languages
+    """
+    code_languages = code_languages or {}
+    output = []
+    for code, chunk in split_code_blocks(lines):
+        if code is None:
+            output.extend(chunk)
+            continue
+        block_language = code_languages.get(code, language)
+        highlighted_lines = highlight.cached(code, block_language)
+        if highlighted_lines is None:
+            highlight.highlighter.submit(code, block_language, lambda lines: None)
+            highlighted_lines = [[('code-block', code_line)] for _, code_line in chunk]
+        output.extend(prefix + line for (prefix, _), line in zip(chunk, highlighted_lines))
+    for line in output:
+        print(''.join(format_str(segment[1], markup_colors.get(segment[0], '')) if isinstance(segment, tuple)
+                      else segment for segment in line))
+
+
 ## For testing exceptions
+def warn(message):
+    """
+    Prints a warning, or shows it in the header while interactive mode runs. Can be called from any thread.
+    :param message: text of the warning
+    """
+    if LOOP is None:
+        print_warning(message)
+    else:
+        call_in_main_loop(lambda: header_for_display.event('warning', ('warning', message)))
+
+
 def showerror(e):
     if DEBUG == True:
         import traceback
@@ -416,26 +1085,35 @@ def showerror(e):
 def socli(query):
     """
     SOCLI Code
-    :param query: Query to search on stackoverflow.
-    If google_search is true uses google search to find the best result.
+    :param query: SearchQuery to search on stackoverflow.
+    Uses google search to find the best result if the query's engine is google.
     Else use stackoverflow default search mechanism.
     :return:
     """
-    query = urlencode(query)
     try:
-        if google_search:
-            questions = get_questions_for_query_google(query)
-            res_url = questions[0][2]  # Gets the first result
-            dispres(res_url)
+        results = search_results(query)
+        try:
+            first = results[0]
+        except IndexError:
+            print_warning("No results found...")
+            sys.exit(0)
+        if not RERANK:
+            dispres(first.url)  # Gets the first result
+            return
+        # Reranking needs more results, which may take further result pages. The first result
+        # is usually still the one shown: it downloads while the others are fetched and ranked.
+        speculative = QuestionPrefetcher([first.url])
+        url = rerank.rerank(query.text, results[:10])[0].url
+        if url == first.url:
+            dispres(url, speculative.get(url))
         else:
-            questions = get_questions_for_query(query)
-            res_url = questions[0][2]
-            dispres(sourl + res_url)  # Returned URL is relative to SO homepage
+            speculative.cancel()
+            dispres(url)
     except UnicodeEncodeError as e:
         showerror(e)
         print_warning("\n\nEncoding error: Use \"chcp 65001\" command before using socli...")
         sys.exit(0)
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         print_fail("Please check your internet connectivity...")
     except Exception as e:
         showerror(e)
@@ -490,7 +1168,43 @@ def helpman():
         " " + bold("--login or -l") + \
               " : Login to Stack Overflow using your email and password." + '\n' + \
         " " + bold("--logout") + \
-              " : Logout of Stack Overflow."
+              " : Logout of Stack Overflow." + '\n' + \
+        " " + bold("--watch or -w") + \
+              " : Watches the question at the given url and prints its new and edited answers as they are posted." + \
+              "\n    eg: " + make_warning(("socli --watch https://stackoverflow.com/questions/11227809")) + '\n' + \
+        " " + bold("--export or -e") + \
+              " : Writes all the questions found by the query or tags, with their answers, to the given file as json" + \
+              " lines. An interrupted export continues where it stopped when the command is run again." + \
+              "\n    eg: " + make_warning(("socli --export python.jsonl --tag python")) + '\n' + \
+        " " + bold("--timeout, --retries and --hedge") + \
+              " : Seconds to wait for a response before giving up (default 30), number of times a failed" + \
+              " download is tried again (default 2), and seconds after which a slow download is requested a" + \
+              " second time, using whichever response arrives first (default never)." + \
+              "\n    eg: " + make_warning(("socli --timeout 10 --hedge 2 for loop in python")) + '\n' + \
+        " " + bold("--no-cache") + \
+              " : Search results are kept on disk for 6 hours and questions for a day. Use this option to" + \
+              " download them again." + '\n' + \
+        " " + bold("--site") + \
+              " : Searches other Stack Exchange sites instead of Stack Overflow: serverfault, superuser," + \
+              " unix, askubuntu or the host of any site of stackexchange.com. The results of several sites" + \
+              " are searched at the same time and merged." + \
+              "\n    eg: " + make_warning(("socli --site serverfault superuser -iq nginx reverse proxy")) + '\n' + \
+        " " + bold("--mem-stats and --mem-limit") + \
+              " : Interactive mode keeps the widgets of the answers shown last, up to 32 MB by default." + \
+              " --mem-limit sets that budget in megabytes, --mem-stats shows what is held in memory." + \
+              "\n    eg: " + make_warning(("socli -i --mem-stats --mem-limit 8 python for loop")) + '\n' + \
+        " " + bold("--rerank") + \
+              " : Orders the search results by the similarity of their title and excerpt to the query" + \
+              " before picking one, instead of keeping the order of the search engine." + \
+              "\n    eg: " + make_warning(("socli --rerank -r 2 python for loop")) + '\n' + \
+        " " + bold("--collapse-similar") + \
+              " : Questions closed as duplicates of a listed question are always hidden. This also hides" + \
+              " the results whose title has the same words as an earlier one and whose excerpt is nearly the same." + \
+              "\n    eg: " + make_warning(("socli --collapse-similar -iq python for loop")) + '\n' + \
+        " " + bold("--warm") + \
+              " : Caches in advance the search results and questions listed in the given file, one query," + \
+              " question url or socli command per line. Entries that are cached already are skipped." + \
+              "\n    eg: " + make_warning(("socli --warm ~/.bash_history")) + ": Caches the last searches made with socli"
 
     helpText = make_header("\n\n< Search Query >:") + '\n' + \
         "\nQuery to search on Stack Overflow" + '\n' + \
@@ -505,7 +1219,7 @@ def helpman():
         "\n\nSoCLI is an open source project hosted on github. Don't forget to star it if you liked it.\nUse GitHub" + \
               " issues to report problems: " + underline("http://github.com/gautamkrishnar/socli")
 
-    screenHeight, screenWidth = subprocess.check_output(['stty', 'size']).split()
+    screenHeight, screenWidth = terminal_size()
     subsequent_indent = '    '
     optionsText = '\n'.join(['\n'.join(textwrap.wrap(line, width=int(screenWidth) - len(subsequent_indent),
                  break_long_words=False, replace_whitespace=False, subsequent_indent=subsequent_indent))
@@ -518,63 +1232,310 @@ def helpman():
     print(helpText)
 
 
-def get_questions_for_query(query, count=10):
+class SearchResults(object):
+    """
+    Lazily paginated list of search results.
+
+    Result pages are only fetched as far as the requested index requires, and
+    every page is kept once fetched. With prefetch enabled, the page following
+    the last one read is downloaded in a background thread.
+    With collapse enabled, duplicate questions are listed once, see cluster.Clusters.
+    """
+
+    def __init__(self, fetch_page, prefetch=False, collapse=True):
+        """
+        :param fetch_page: function taking a page number (starting at 1) and returning the list of questions on it
+        :param prefetch: fetch the next page in the background whenever a page is read
+        :param collapse: list the questions known to be duplicates of a listed one with it
+        """
+        self.clusters = cluster.Clusters(lambda hit: thread_key(hit.url), cached_duplicate_of,
+                                         COLLAPSE_SIMILAR) if collapse else None
+        self.fetch_page = fetch_page
+        self.prefetch = prefetch
+        self.pages = {}  # Page number => list of questions
+        self.results = []
+        self.read_pages = 0  # Pages appended to results
+        self.seen = set()  # Threads in results, so that a thread is only listed once
+        self.exhausted = False
+        self.lock = threading.Lock()
+        self.workers = {}  # Page number => prefetch thread
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.stop is None or index.stop < 0 or (index.start or 0) < 0:
+                self.fetch_all()
+            else:
+                self.fetch_until(index.stop - 1)
+            return self.results[index]
+        if index < 0:
+            self.fetch_all()
+        else:
+            self.fetch_until(index)
+        return self.results[index]
+
+    def __iter__(self):
+        i = 0
+        while True:
+            try:
+                yield self[i]
+            except IndexError:
+                return
+            i += 1
+
+    def loaded(self):
+        """
+        :return: number of results fetched so far
+        """
+        return len(self.results)
+
+    def duplicates(self, index):
+        """
+        :param index: index of a fetched result
+        :return: list of the results hidden as duplicates of it
+        """
+        if self.clusters is None:
+            return []
+        return self.clusters.groups[index][1:]
+
+    def fetch_until(self, index):
+        """
+        Fetches result pages until the result at index is available or there are no more results.
+        :param index: index of the result required
+        """
+        while len(self.results) <= index and not self.exhausted:
+            self.next_page()
+
+    def fetch_all(self):
+        while not self.exhausted:
+            self.next_page()
+
+    def next_page(self):
+        """
+        Appends the next page of results, waiting for the prefetch thread if one is downloading it.
+        :return: list of questions on the page, including the ones dropped as duplicates
+        """
+        page = self.read_pages + 1
+        worker = self.workers.pop(page, None)
+        if worker is not None:
+            worker.join()
+        questions = self.load_page(page)
+        self.read_pages = page
+        for question in canonicalize_results(questions, self.seen):
+            if self.clusters is None:
+                self.results.append(question)
+                continue
+            index = self.clusters.add(question)
+            if index == len(self.results):
+                self.results.append(question)
+            else:
+                self.results[index] = self.clusters.groups[index][0]
+        if not questions:
+            self.exhausted = True
+        elif self.prefetch:
+            self.start_prefetch(page + 1)
+        return questions
+
+    def load_page(self, page):
+        """
+        Returns a result page, fetching it if it is not cached yet.
+        :param page: page number
+        """
+        with self.lock:
+            if page in self.pages:
+                return self.pages[page]
+        questions = self.fetch_page(page)
+        with self.lock:
+            return self.pages.setdefault(page, questions)
+
+    def start_prefetch(self, page):
+        if page in self.pages or page in self.workers:
+            return
+
+        def prefetch():
+            try:
+                self.load_page(page)
+            except (Exception, SystemExit) as e:
+                # The page is fetched again in the foreground, which reports the error.
+                showerror(e)
+
+        worker = threading.Thread(target=prefetch)
+        worker.daemon = True
+        self.workers[page] = worker
+        worker.start()
+
+
+class SearchQuery(namedtuple('SearchQuery', ['text', 'tags', 'engine', 'sites'])):
     """
-    Fetch questions for a query using stackoverflow default search mechanism.
-    Returned question urls are relative to SO homepage.
-    At most 10 questions are returned. (Can be altered by passing count)
-    :param query: User-entered query string
-    :return: list of [ (question_text, question_description, question_url) ]
+    Parameters of a search: query text, tags, search engine and the Stack Exchange sites searched.
+
+    It is immutable, so that searches with different parameters can run in parallel threads
+    without sharing any state, and hashable, so that it identifies the search in caches.
     """
+
+    __slots__ = ()
+    GOOGLE = 'google'
+    STACKOVERFLOW = 'stackoverflow'
+
+    def __new__(cls, text, tags=(), engine=GOOGLE, sites=(sites.DEFAULT_SITE,)):
+        """
+        :param text: User-entered query string
+        :param tags: Stack Overflow tags to search in. Searches with tags use Stack Overflow search.
+        :param engine: SearchQuery.GOOGLE or SearchQuery.STACKOVERFLOW, which stands for the search of the site
+        :param sites: names of the sites to search, the results of several sites are merged
+        """
+        tags = tuple(tags or ())
+        if tags:
+            engine = cls.STACKOVERFLOW
+        return super(SearchQuery, cls).__new__(cls, ' '.join(text.split()), tags, engine, tuple(sites))
+
+    @property
+    def site(self):
+        """
+        :return: Site object of a search of a single site
+        """
+        if len(self.sites) != 1:
+            raise ValueError("Search of several sites: " + ', '.join(self.sites))
+        return sites.get(self.sites[0])
+
+    def on(self, site):
+        """
+        :param site: name of a site
+        :return: the same search on this site only
+        """
+        return self._replace(sites=(site,))
+
+    def using(self, engine):
+        """
+        :return: the same search on another search engine
+        """
+        return self._replace(engine=engine)
+
+    def url(self, page=1):
+        """
+        :param page: page number, starting at 1
+        :return: url of a result page of a search of a single site
+        """
+        if self.engine == self.GOOGLE:
+            url = google_search_url + "site:" + self.site.host + "+" + urlencode(self.text)
+            if page > 1:
+                url += "&start=" + str((page - 1) * 10)
+        else:
+            url = self.site.url + "/search?q=" + ''.join("[" + tag + "]+" for tag in self.tags) + urlencode(self.text)
+            if page > 1:
+                url += "&page=" + str(page)
+        return url
+
+
+search_pages = LRUCache(SEARCH_CACHE_SIZE)  # ( SearchQuery, page number ) => list of SearchHit objects
+
+
+def search_results(query, prefetch=False, collapse=True):
+    """
+    Lazily paginated results of a query using its search engine.
+    :param query: SearchQuery object
+    :param prefetch: fetch the next result page in the background
+    :param collapse: list duplicate questions once
+    :return: SearchResults object
+    """
+    return SearchResults(lambda page: get_search_page(query, page), prefetch, collapse)
+
+
+def get_search_page(query, page=1):
+    """
+    Fetch a single result page using the search engine of the query.
+    Pages are cached by query and page number.
+    :param query: SearchQuery object
+    :param page: page number, starting at 1
+    :return: list of SearchHit objects
+    """
+    if len(query.sites) > 1:
+        # Merged pages are not cached: the page of every site is, and a page missing a failed site must not be kept
+        return get_sites_search_page(query, page)
+    key = (query, page)
+    questions = search_pages.get(key)
+    if questions is None:
+        if query.engine == SearchQuery.GOOGLE:
+            questions = get_google_search_page(query, page)
+        else:
+            questions = get_so_search_page(query, page)
+        search_pages[key] = questions
+    return list(questions)
+
+
+def get_sites_search_page(query, page=1):
+    """
+    Fetch a result page of every site of a query at the same time, and merge them.
+    The results are interleaved: the first result of every site, then the second ones, and so on.
+    A site that fails is reported and left out. When all of them fail, the error of the first one is raised.
+    :param query: SearchQuery object of several sites
+    :param page: page number, starting at 1
+    :return: list of SearchHit objects
+    """
+    pages = [[] for _ in query.sites]
+    errors = [None for _ in query.sites]
+
+    def search(i, site):
+        try:
+            pages[i] = get_search_page(query.on(site), page)
+        except (Exception, SystemExit) as e:
+            showerror(e)
+            errors[i] = e
+
+    workers = [threading.Thread(target=search, args=(i, site)) for i, site in enumerate(query.sites)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    for worker in workers:
+        worker.join()
+    failed = [site for site, error in zip(query.sites, errors) if error is not None]
+    if len(failed) == len(query.sites):
+        raise errors[0]
+    if failed:
+        warn("Could not search " + ', '.join(failed) + ", its results are left out.")
+    questions = []
+    for rank in range(max(len(site_page) for site_page in pages)):
+        questions.extend(site_page[rank] for site_page in pages if rank < len(site_page))
+    return questions
+
+
+def get_so_search_page(query, page=1):
+    """
+    Fetch a single result page of stackoverflow default search.
+    :param query: SearchQuery object
+    :param page: page number, starting at 1
+    :return: list of SearchHit objects
+    """
+    site = query.site
+    soup = fetch_soup(query.using(SearchQuery.STACKOVERFLOW).url(page), SEARCH_MAX_AGE, site)
     questions = []
-    randomheaders()
-    search_res = requests.get(soqurl + query, headers=header)
-    captchacheck(search_res.url)
-    soup = BeautifulSoup(search_res.text, 'html.parser')
-    try:
-        soup.find_all("div", class_="question-summary")[0]  # For explicitly raising exception
-    except IndexError:
-        print_warning("No results found...")
-        sys.exit(0)
     tmp = (soup.find_all("div", class_="question-summary"))
     tmp1 = (soup.find_all("div", class_="excerpt"))
-    i = 0
-    while (i < len(tmp)):
-        if i == count: break  # limiting results
+    for i in range(min(len(tmp), len(tmp1))):
         question_text = ' '.join((tmp[i].a.get_text()).split())
         question_text = question_text.replace("Q: ", "")
         question_desc = (tmp1[i].get_text()).replace("'\r\n", "")
         question_desc = ' '.join(question_desc.split())
         question_local_url = tmp[i].a.get("href")
-        questions.append((question_text, question_desc, question_local_url))
-        i = i + 1
+        questions.append(SearchHit(question_text, question_desc, site.url + question_local_url))
     return questions
 
 
-def get_questions_for_query_google(query, count=10):
+def get_google_search_page(query, page=1):
     """
-    Fetch questions for a query using Google search.
-    Returned question urls are URLS to SO homepage.
-    At most 10 questions are returned. (Can be altered by passing count)
-    :param query: User-entered query string
-    :return: list of [ (question_text, question_description, question_url) ]
+    Fetch a single result page of Google search.
+    Results that are not questions of the site searched are skipped.
+    :param query: SearchQuery object
+    :param page: page number, starting at 1
+    :return: list of SearchHit objects
     """
-    i = 0
+    site = query.site
+    soup = fetch_soup(query.using(SearchQuery.GOOGLE).url(page), SEARCH_MAX_AGE, site)
     questions = []
-    randomheaders()
-    search_results = requests.get(google_search_url + query, headers=header)
-    captchacheck(search_results.url)
-    soup = BeautifulSoup(search_results.text, 'html.parser')
-    try:
-        soup.find_all("div", class_="g")[0]  # For explicitly raising exception
-    except IndexError:
-        print_warning("No results found...")
-        sys.exit(0)
     for result in soup.find_all("div", class_="g"):
-        if i == count:
-            break
         try:
-            question_title = result.find("h3", class_="r").get_text()[:-17]
+            question_title = result.find("h3", class_="r").get_text()
+            if question_title.endswith(" - " + site.title):
+                question_title = question_title[:-len(" - " + site.title)]
             question_desc = result.find("span", class_="st").get_text()
             if question_desc=="": # For avoiding instant answers
                 raise NameError #Explicit raising
@@ -582,212 +1543,392 @@ def get_questions_for_query_google(query, count=10):
             question_url = fixGoogleURL(question_url)
 
             if question_url is None:
-                i = i-1
                 continue
 
-            questions.append([question_title, question_desc, question_url])
-            i += 1
+            questions.append(SearchHit(question_title, question_desc, question_url))
         except NameError:
             continue
         except AttributeError:
             continue
-
-    #Check if there are any valid question posts
-    if not questions:
-        print_warning("No results found...")
-        sys.exit(0)
     return questions
 
 
-def get_question_stats_and_answer(url):
+def site_of(url):
     """
-    Fetch the content of a StackOverflow page for a particular question.
-    :param url: full url of a StackOverflow question
-    :return: tuple of ( question_title, question_desc, question_stats, answers )
+    :param url: url of a page
+    :return: Site object of the page, Stack Overflow for pages of other hosts
+    """
+    return sites.for_url(url) or sites.default()
+
+
+def fetch_soup(url, max_age=0, site=None):
+    """
+    Fetch a page with a random user agent and parse it.
+    The request goes through the pooled session of the site, with the login cookies if logged in.
+    Exits if a captcha check is triggered.
+    :param url: URL of the page
+    :param max_age: seconds a copy of the page in the disk cache can be used for, 0 to always download it
+    :param site: Site object whose connections and cache are used, None for the site of the url
+    :return: BeautifulSoup object
+    """
+    site = site or site_of(url)
+    if max_age:
+        page = site.page_cache.get(url, max_age)
+        if page is not None:
+            return BeautifulSoup(page.decode('utf-8'), 'html.parser')
+    randomheaders()
+    res_page = site.get(url, headers=header)
+    captchacheck(res_page.url)
+    if max_age and res_page.status_code == 200:
+        site.page_cache.put(url, res_page.text.encode('utf-8'))
+    return BeautifulSoup(res_page.text, 'html.parser')
+
+
+def fetch_soup_if_modified(url, validators):
+    """
+    Fetch a page only if it changed since the last time, using the ETag and Last-Modified
+    headers the server sent with it.
+    :param url: URL of the page
+    :param validators: dict of the validators of the last copy of the page, updated in place
+    :return: BeautifulSoup object, None if the page did not change
     """
     randomheaders()
-    res_page = requests.get(url, headers=header)
+    headers = dict(header)
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last-modified'):
+        headers['If-Modified-Since'] = validators['last-modified']
+    res_page = site_of(url).get(url, headers=headers)
+    if res_page.status_code == 304:
+        return None
     captchacheck(res_page.url)
-    soup = BeautifulSoup(res_page.text, 'html.parser')
-    question_title, question_desc, question_stats = get_stats(soup)
-    answers = [s.get_text() for s in soup.find_all("div", class_="post-text")][
-              1:]  # first post is question, discard it.
+    validators['etag'] = res_page.headers.get('ETag')
+    validators['last-modified'] = res_page.headers.get('Last-Modified')
+    return BeautifulSoup(res_page.text, 'html.parser')
+
+
+def get_question_stats_and_answer(url, max_age=None):
+    """
+    Fetch the content of a StackOverflow page for a particular question.
+    The parsed question is kept in the disk cache, and used instead of the page while it is recent enough.
+    :param url: full url of a StackOverflow question
+    :param max_age: seconds a cached copy can be used for, 0 to always download the page,
+                    None for QUESTION_MAX_AGE
+    :return: Question object, with the answers in page order
+    """
+    if max_age is None:
+        max_age = QUESTION_MAX_AGE
+    site = site_of(url)
+    if max_age:
+        cached = site.question_cache.get(url, max_age)
+        if cached is not None:
+            cached = json.loads(cached.decode('utf-8'))
+            remember_answer_question(url, cached['question_url'])
+            question = Question.from_dict(cached['question'])
+            site.record_duplicate_of(url, question.duplicate_of)  # Questions cached before the index existed
+            return question
+    return parse_question(url, fetch_soup(url, site=site))
+
+
+def parse_question(url, soup):
+    """
+    Parse the page of a question, and keep the question in the disk cache.
+    :param url: full url the page was fetched with
+    :param soup: BeautifulSoup object of the page
+    :return: Question object, with the answers in page order
+    """
+    site = site_of(url)
+    question_link = soup.find("a", class_="question-hyperlink")
+    question_url = question_link.get("href") if question_link is not None else None
+    remember_answer_question(url, question_url)
+    question_title, question_desc, question_stats, question_desc_markup = get_stats(soup)
+    language = page_language(soup)
+    answers = get_answers(soup, language)
     if len(answers) == 0:
-        answers.append('No answers for this question ...')
-    return question_title, question_desc, question_stats, answers
+        answers.append(Answer('No answers for this question ...'))
+    linked, related = get_related(soup, site.url)
+    question = Question(question_title, question_desc, question_stats, url, answers, question_desc_markup, language,
+                        linked, related, get_duplicate_of(soup, site.url))
+    site.question_cache.put(url, json.dumps({'question': question.to_dict(), 'question_url': question_url}).encode('utf-8'))
+    site.record_duplicate_of(url, question.duplicate_of)
+    return question
+
+
+class QuestionPrefetcher(object):
+    """
+    Fetches question pages in a background thread, one after the other in the order given,
+    so that the question picked from a list of results is usually downloaded and parsed already.
+    """
+
+    def __init__(self, urls, limiter=None):
+        """
+        :param urls: urls of the questions, most likely to be picked first
+        :param limiter: network.RateLimiter spacing out the prefetches, None to fetch them back to back
+        """
+        self.pending = deque(urls)
+        self.limiter = limiter
+        self.questions = {}  # url => Question
+        self.fetching = {}  # url => threading.Event set once the fetch ends
+        self.lock = threading.Lock()
+        worker = threading.Thread(target=self.run)
+        worker.daemon = True
+        worker.start()
+
+    def run(self):
+        while True:
+            if self.limiter is not None:
+                with self.lock:
+                    url = self.pending[0] if self.pending else None
+                age = site_of(url).question_cache.age(url) if url is not None else None
+                if url is not None and (age is None or age >= QUESTION_MAX_AGE):
+                    self.limiter.wait()  # Only downloads are spaced out
+            with self.lock:
+                if not self.pending:
+                    return
+                url = self.pending.popleft()
+                if url in self.questions or url in self.fetching:
+                    continue
+                done = self.fetching[url] = threading.Event()
+            try:
+                self.fetch(url, done)
+            except (Exception, SystemExit) as e:
+                # The question is fetched again in the foreground, which reports the error.
+                showerror(e)
+
+    def fetch(self, url, done):
+        """ Fetches a question claimed by adding done to self.fetching. """
+        try:
+            question = get_question_stats_and_answer(url)
+            with self.lock:
+                self.questions[url] = question
+            return question
+        finally:
+            with self.lock:
+                del self.fetching[url]
+            done.set()
+
+    def get(self, url):
+        """
+        Returns a question, waiting for its prefetch if it is running, or fetching it now.
+        :param url: url of the question
+        :return: Question object
+        """
+        with self.lock:
+            question = self.questions.get(url)
+            done = self.fetching.get(url)
+            if question is None and done is None:
+                done = self.fetching[url] = threading.Event()
+                claimed = True
+            else:
+                claimed = False
+        if claimed:
+            return self.fetch(url, done)
+        if question is None:
+            done.wait()
+            with self.lock:
+                question = self.questions.get(url)
+            if question is None:  # The prefetch failed
+                question = get_question_stats_and_answer(url)
+        return question
+
+    def cancel(self):
+        """ Drops the questions not prefetched yet. The one being fetched is kept. """
+        with self.lock:
+            self.pending.clear()
+
+
+def print_question(question):
+    """
+    Prints the title, statistics and description of a question, for the Windows interactive mode.
+    :param question: Question object
+    """
+    print_header("\n" + dispstr(question.title))
+    print_blue(dispstr(question.stats) + "\n")
+    if question.desc_markup is not None:
+        print_markup(question.desc_markup, language=question.language)
+    else:
+        print(dispstr(question.desc))
+
+
+def print_answer(answer, language=None):
+    """
+    Prints an answer with its statistics, for the Windows interactive mode.
+    :param answer: Answer object
+    :param language: language of the code blocks that do not tell theirs
+    """
+    print_green("\n\nAnswer:\n")
+    print_blue(dispstr(AnswerText.answer_stats(answer)))
+    print("-------")
+    if answer.markup is not None:
+        print_markup(answer.markup, dict((code, block_language) for block_language, code in answer.code_blocks),
+                     language)
+    else:
+        print(dispstr(answer.text))
+    print("-------\n")
 
 
 def socli_interactive_windows(query):
     """
     Interactive mode basic implimentation for windows, since urwind doesn't suports CMD.
-    :param query:
+    Uses the same search and question parsing as the other modes. The listed questions are
+    fetched in the background while the user chooses, and the answers of the chosen question
+    are parsed once, so moving between them only prints them.
+    :param query: SearchQuery object
     :return:
     """
     try:
-        search_res = requests.get(soqurl + query)
-        captchacheck(search_res.url)
-        soup = BeautifulSoup(search_res.text, 'html.parser')
+        results = search_results(query)
+        questions = results[:10]  # limiting results
+        if not questions:
+            print_warning("No results found...")
+            sys.exit(0)
+        prefetcher = QuestionPrefetcher([question.url for question in questions])
+        print(bold("\nSelect a question below:\n"))
+        for i, question in enumerate(questions):
+            print_warning(str(i + 1) + ". " + dispstr(question.title))
+            duplicates = len(results.duplicates(i))
+            if duplicates:
+                print("  (" + str(duplicates) + " duplicates hidden)")
+            print("  " + dispstr(question.desc) + "\n")
         try:
-            soup.find_all("div", class_="question-summary")[0]  # For explictly raising exception
-            tmp = (soup.find_all("div", class_="question-summary"))
-            tmp1 = (soup.find_all("div", class_="excerpt"))
-            i = 0
-            question_local_url = []
-            print(bold("\nSelect a question below:\n"))
-            while (i < len(tmp)):
-                if i == 10: break  # limiting results
-                question_text = ' '.join((tmp[i].a.get_text()).split())
-                question_text = question_text.replace("Q: ", "")
-                question_desc = (tmp1[i].get_text()).replace("'\r\n", "")
-                question_desc = ' '.join(question_desc.split())
-                print_warning(str(i + 1) + ". " + dispstr(question_text))
-                question_local_url.append(tmp[i].a.get("href"))
-                print("  " + dispstr(question_desc) + "\n")
-                i = i + 1
-            try:
-                op = int(inputs("\nType the option no to continue or any other key to exit:"))
-                while 1:
-                    if (op > 0) and (op <= i):
-                        dispres(sourl + question_local_url[op - 1])
-                        cnt = 1  # this is because the 1st post is the question itself
-                        while 1:
-                            global tmpsoup
-                            qna = inputs(
-                                "Type " + bold("o") + " to open in browser, " + bold("n") + " to next answer, " + bold(
-                                    "b") + " for previous answer or any other key to exit:")
-                            if qna in ["n", "N"]:
-                                try:
-                                    answer = (tmpsoup.find_all("div", class_="post-text")[cnt + 1].get_text())
-                                    print_green("\n\nAnswer:\n")
-                                    print("-------\n" + answer + "\n-------\n")
-                                    cnt = cnt + 1
-                                except IndexError as e:
-                                    print_warning(" No more answers found for this question. Exiting...")
-                                    sys.exit(0)
-                                continue
-                            elif qna in ["b", "B"]:
-                                if cnt == 1:
-                                    print_warning(" You cant go further back. You are on the first answer!")
-                                    continue
-                                answer = (tmpsoup.find_all("div", class_="post-text")[cnt - 1].get_text())
-                                print_green("\n\nAnswer:\n")
-                                print("-------\n" + answer + "\n-------\n")
-                                cnt = cnt - 1
-                                continue
-                            elif qna in ["o", "O"]:
-                                import webbrowser
-                                if sys.platform.startswith('darwin'):
-                                    browser = webbrowser.get('safari')
-                                else:
-                                    browser = webbrowser.get()
-                                print_warning("Opening in your browser...")
-                                browser.open(sourl + question_local_url[op - 1])
-                            else:
-                                break
+            op = int(inputs("\nType the option no to continue or any other key to exit:"))
+            while not 0 < op <= len(questions):
+                op = int(inputs("\n\nWrong option. select the option no to continue:"))
+            question = prefetcher.get(questions[op - 1].url)
+            answers = question.answers
+            cnt = 0
+            print_question(question)
+            print_answer(answers[cnt], question.language)
+            while 1:
+                qna = inputs(
+                    "Type " + bold("o") + " to open in browser, " + bold("n") + " to next answer, " + bold(
+                        "b") + " for previous answer or any other key to exit:")
+                if qna in ["n", "N"]:
+                    if cnt + 1 >= len(answers):
+                        print_warning(" No more answers found for this question. Exiting...")
                         sys.exit(0)
+                    cnt = cnt + 1
+                    print_answer(answers[cnt], question.language)
+                elif qna in ["b", "B"]:
+                    if cnt == 0:
+                        print_warning(" You cant go further back. You are on the first answer!")
+                        continue
+                    cnt = cnt - 1
+                    print_answer(answers[cnt], question.language)
+                elif qna in ["o", "O"]:
+                    import webbrowser
+                    if sys.platform.startswith('darwin'):
+                        browser = webbrowser.get('safari')
                     else:
-                        op = int(input("\n\nWrong option. select the option no to continue:"))
-            except Exception as e:
-                showerror(e)
-                print_warning("\n Exiting...")
-                sys.exit(0)
-        except IndexError:
-            print_warning("No results found...")
+                        browser = webbrowser.get()
+                    print_warning("Opening in your browser...")
+                    browser.open(question.url)
+                else:
+                    break
+            sys.exit(0)
+        except Exception as e:
+            showerror(e)
+            print_warning("\n Exiting...")
             sys.exit(0)
 
     except UnicodeEncodeError:
         print_warning("\n\nEncoding error: Use \"chcp 65001\" command before using socli...")
         sys.exit(0)
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         print_fail("Please check your internet connectivity...")
     except Exception as e:
         showerror(e)
         sys.exit(0)
 
 
+def format_bytes(size):
+    """
+    :param size: number of bytes
+    :return: size in the largest unit it has at least one of
+    """
+    for unit in ('bytes', 'KB', 'MB'):
+        if size < 1024:
+            return ('%d %s' if unit == 'bytes' else '%.1f %s') % (size, unit)
+        size /= 1024.0
+    return '%.1f GB' % size
+
+
+def memory_stats(select_page=None):
+    """
+    What interactive mode holds in memory.
+    :param select_page: SelectQuestionPage of the session, None if there is none
+    :return: list of tuples of ( name, entries, estimated bytes or None, details )
+    """
+    stats = []
+    if select_page is not None:
+        questions = select_page.cachedQuestions.values()
+        stats.append(('Parsed questions', len(questions),
+                      sum(len(json.dumps(question.to_dict())) for question in questions),
+                      'at most ' + str(select_page.cachedQuestions.capacity)))
+        stats.append(('Search results', select_page.questions.loaded(), None,
+                      str(len(select_page.walker)) + ' listed'))
+    stats.append(('Answer widgets', len(rendered_answers), rendered_answers.weight,
+                  'budget ' + format_bytes(rendered_answers.capacity) + ', ' +
+                  str(rendered_answers.evictions) + ' evicted'))
+    stats.append(('Highlighted code', len(highlight.highlighted), None, ''))
+    stats.append(('Search pages', len(search_pages), None, ''))
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats.append(('Peak process memory', None, peak if sys.platform == 'darwin' else peak * 1024, ''))
+    except ImportError:
+        pass
+    return stats
+
+
+def memory_summary(select_page=None):
+    """
+    :return: one line summary of memory_stats
+    """
+    return ' | '.join(name + ': ' + ', '.join(filter(None, [str(entries) if entries is not None else None,
+                                                             format_bytes(size) if size is not None else None]))
+                      for name, entries, size, _ in memory_stats(select_page))
+
+
+def print_memory_stats(select_page=None):
+    print(bold("\nMemory used by the session:"))
+    for name, entries, size, details in memory_stats(select_page):
+        print("  " + name + ": " + ', '.join(filter(None, [
+            str(entries) + " entries" if entries is not None else None,
+            format_bytes(size) if size is not None else None, details])))
+
+
 def socli_interactive(query):
     """
     Interactive mode
+    :param query: SearchQuery object
     :return:
     """
     if sys.platform == 'win32':
         return socli_interactive_windows(query)
 
-    class SelectQuestionPage(urwid.WidgetWrap):
-
-        def display_text(self, index, question):
-            question_text, question_desc, _ = question
-            text = [
-                ("warning", u"{}. {}\n".format(index, question_text)),
-                question_desc + "\n",
-            ]
-            return text
-
-        def __init__(self, questions):
-            self.questions = questions
-            self.cachedQuestions = [None for _ in range(10)]
-            widgets = [self.display_text(i, q) for i, q in enumerate(questions)]
-            self.questions_box = ScrollableTextBox(widgets)
-            self.header = UnicodeText(('less-important', 'Select a question below:\n'))
-            self.footerText = '0-' + str(len(self.questions) - 1) + ': select a question, any other key: exit.'
-            self.errorText = UnicodeText.to_unicode('Question numbers range from 0-' +
-                                                    str(len(self.questions) - 1) +
-                                                    ". Please select a valid question number.")
-            self.footer = UnicodeText(self.footerText)
-            self.footerText = UnicodeText.to_unicode(self.footerText)
-            frame = urwid.Frame(header=self.header,
-                                body=urwid.Filler(self.questions_box, height=('relative', 100), valign='top'),
-                                footer=self.footer)
-            urwid.WidgetWrap.__init__(self, frame)
-
-        # Override parent method
-        def selectable(self):
-            return True
-
-        def keypress(self, size, key):
-            if key in '0123456789':
-                try:
-                    question_url = self.questions[int(key)][2]
-                    self.footer.set_text(self.footerText)
-                    self.select_question(question_url, int(key))
-                except IndexError as e:
-                    self.footer.set_text(self.errorText)
-            elif key in {'down', 'up'}:
-                self.questions_box.keypress(size, key)
-            else:
-                raise urwid.ExitMainLoop()
-
-        def select_question(self, url, index):
-            global question_post
-            if self.cachedQuestions[index] != None:
-                question_post = self.cachedQuestions[index]
-                LOOP.widget = question_post
-            else:
-                if not google_search:
-                    url = sourl + url
-                question_title, question_desc, question_stats, answers = get_question_stats_and_answer(url)
-                question_post = QuestionPage((answers, question_title, question_desc, question_stats, url))
-                self.cachedQuestions[index] = question_post
-                LOOP.widget = question_post
-
     global header_for_display
     global question_page
     global LOOP
     header_for_display = Header()
 
     try:
-        if google_search:
-            questions = get_questions_for_query_google(query)
-        else:
-            questions = get_questions_for_query(query)
+        questions = search_results(query, prefetch=True)
+        try:
+            questions[0]
+        except IndexError:
+            print_warning("No results found...")
+            sys.exit(0)
         question_page = SelectQuestionPage(questions)
         LOOP = EditedMainLoop(question_page, palette)
         LOOP.run()
+        if MEM_STATS:
+            print_memory_stats(question_page)
 
     except UnicodeEncodeError:
         print_warning("\n\nEncoding error: Use \"chcp 65001\" command before using socli...")
         sys.exit(0)
-    except requests.exceptions.ConnectionError as e:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
         print_fail("Please check your internet connectivity...")
     except Exception as e:
         showerror(e)
@@ -798,7 +1939,7 @@ def socli_interactive(query):
 def socl_manusearch(query, rn):
     """
     Manual search by question index
-    :param query:
+    :param query: SearchQuery object
     :param rn:
     :return:
     """
@@ -806,20 +1947,15 @@ def socl_manusearch(query, rn):
         print_warning(
             "Count starts from 1. Use: \"socli -i 2 -q python for loop\" for the 2nd result for the query")
         sys.exit(0)
-    query = urlencode(query)
     try:
-        randomheaders()
-        #Set count = 99 so you can choose question numbers higher than 10
-        count = 99
         res_url = None
         try:
-            if google_search:
-                questions = get_questions_for_query_google(query, count)
-                res_url = questions[rn - 1][2]
-            else:
-                questions = get_questions_for_query(query, count)
-                res_url = sourl + questions[rn - 1][2]
-            dispres(res_url)
+            # Result pages are only fetched up to the one holding the rn'th question.
+            # Duplicates are kept, so that rn counts the results as the search engine lists them.
+            questions = search_results(query, collapse=False)
+            if RERANK:
+                questions = rerank.rerank(query.text, questions[:max(rn, 10)])
+            dispres(questions[rn - 1].url)
         except IndexError:
             print_warning("No results found...")
             sys.exit(1)
@@ -827,7 +1963,468 @@ def socl_manusearch(query, rn):
         print_warning("Encoding error: Use \"chcp 65001\" command before "
                       "using socli...")
         sys.exit(0)
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        print_fail("Please check your internet connectivity...")
+    except Exception as e:
+        showerror(e)
+        sys.exit(0)
+
+
+class QuestionWatcher(object):
+    """
+    Polls a question for new and edited answers.
+
+    Every poll first asks the API for the answers active since the last one, which costs a
+    small json response and no page download when nothing happened. The page is only
+    fetched when the API reports activity, or cannot be used, and then with a conditional
+    request. Only the answers reported by the API are parsed and compared with the known ones.
+    The interval between polls doubles while nothing changes.
+    """
+
+    MIN_INTERVAL = 60  # Seconds between polls after a change
+    MAX_INTERVAL = 30 * 60  # Longest interval between polls
+    CLOCK_SLACK = 60  # Seconds of activity checked again, in case the local clock is ahead
+
+    def __init__(self, url):
+        """
+        :param url: url of the question or of one of its answers
+        """
+        from . import quota
+        match = thread_url_re.match(url)
+        if match is None:
+            raise ValueError("Not a question url: " + url)
+        self.url = url
+        self.host = match.group(1)
+        question_id = match.group(2) or match.group(4)
+        self.question_id = question_id and int(question_id)
+        self.answer_id = match.group(5) and int(match.group(5))
+        self.validators = {}  # ETag and Last-Modified of the page
+        self.answers = {}  # Answer id => Answer
+        self.checked = None  # Time of the last poll
+        self.interval = self.MIN_INTERVAL
+        self.site = quota.Site(self.host, app_key=app_data.get("api_key"), cache=0)
+
+    def start(self):
+        """
+        Fetches the question and the answers it has now.
+        :return: Question object
+        """
+        self.checked = time.time()
+        # Records the validators of the page, so that the first poll can send a conditional request
+        question = parse_question(self.url, fetch_soup_if_modified(self.url, self.validators))
+        if self.question_id is None:
+            # Learnt from the page of an answer url
+            self.question_id = answer_questions.get((self.host, self.answer_id))
+        self.answers = dict((answer.answer_id, answer) for answer in question.answers
+                            if answer.answer_id is not None)
+        return question
+
+    def active_answers(self, since):
+        """
+        :param since: time to look for activity from
+        :return: set of the ids of the answers active since then, None if the API can not tell
+        """
+        from . import quota
+        if self.question_id is None:
+            return None
+        try:
+            response = self.site.fetch('questions/%d/answers' % self.question_id, sort='activity', order='desc',
+                                       min=int(since) - self.CLOCK_SLACK, pagesize=100)
+        except (quota.QuotaExceededError, quota.BackoffError, quota.stackexchange.StackExchangeError) as e:
+            showerror(e)
+            return None
+        if response.get('has_more'):
+            return None
+        return set(item['answer_id'] for item in response.get('items', []))
+
+    def poll(self):
+        """
+        :return: list of ( 'new' or 'edited', Answer ) for the changes since the last poll
+        """
+        now = time.time()
+        answer_ids = self.active_answers(self.checked)
+        changes = []
+        if answer_ids is None or answer_ids:
+            soup = fetch_soup_if_modified(self.url, self.validators)
+            if soup is not None:
+                for answer in get_answers(soup, page_language(soup), answer_ids):
+                    known = self.answers.get(answer.answer_id)
+                    if known is None:
+                        changes.append(('new', answer))
+                    elif known.text != answer.text:
+                        changes.append(('edited', answer))
+                    if answer.answer_id is not None:
+                        self.answers[answer.answer_id] = answer
+        self.checked = now
+        self.interval = self.MIN_INTERVAL if changes else min(self.interval * 2, self.MAX_INTERVAL)
+        return changes
+
+
+def watch(url):
+    """
+    Prints the new and edited answers of a question as they are posted, until interrupted.
+    :param url: url of the question
+    :return:
+    """
+    try:
+        watcher = QuestionWatcher(url)
+        question = watcher.start()
+        print_question(question)
+        print_warning("\n%d answers. Watching for new ones, press Ctrl+C to stop..." % len(watcher.answers))
+        while True:
+            time.sleep(watcher.interval)
+            for change, answer in watcher.poll():
+                print_header("\n" + time.strftime("%H:%M") + (" New answer" if change == 'new' else " Edited answer"))
+                print_answer(answer, question.language)
+    except KeyboardInterrupt:
+        print_warning("\nStopped watching.")
+    except ValueError as e:
+        print_warning(str(e))
+        sys.exit(1)
+    except UnicodeEncodeError:
+        print_warning("\n\nEncoding error: Use \"chcp 65001\" command before using socli...")
+        sys.exit(0)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        print_fail("Please check your internet connectivity...")
+    except Exception as e:
+        showerror(e)
+        sys.exit(0)
+
+
+def export_record(question):
+    """
+    Flat form of a question for the export: plain text only, and code blocks as objects,
+    so that every line has the same fields with a single type each.
+    :param question: Question object
+    :return: dict suitable for json
+    """
+    data = question.to_dict()
+    del data['desc_markup']
+    match = question_url_re.search(question.url)
+    data['question_id'] = int(match.group(1)) if match is not None else None
+    for answer in data['answers']:
+        del answer['markup']
+        answer['code_blocks'] = [{'language': language, 'code': code} for language, code in answer['code_blocks']]
+    return data
+
+
+class Exporter(object):
+    """
+    Writes every question found by a search, with its answers, to a file as json lines.
+
+    Result pages are exported one at a time. The questions of a page are fetched by a bounded
+    number of threads while the next result page is fetched, and written in result order as
+    soon as they arrive, so only one page of questions is held in memory.
+    A checkpoint file next to the output records the last page written, the size of the
+    output at that point and the threads of the last pages. An interrupted export started again
+    with the same search continues from there, after cutting off the lines of the unfinished page.
+    A thread listed again within EXPORT_SEEN_PAGES pages, as results shift while the pages are
+    read, is not written twice. Older threads are forgotten, so memory and checkpoint stay small.
+    """
+
+    def __init__(self, query, path, workers=EXPORT_WORKERS):
+        """
+        :param query: SearchQuery object
+        :param path: file to write
+        :param workers: number of questions fetched at the same time
+        """
+        self.query = query
+        self.path = path
+        self.workers = workers
+        self.search = ' '.join(query.on(site).url() for site in query.sites)  # Identifies the search in the checkpoint
+        self.checkpoint = JSONStore(path + '.checkpoint')
+        self.exported = 0
+        self.failed = 0
+        self.recent = deque(maxlen=EXPORT_SEEN_PAGES)  # Sets of the threads of the last pages exported
+
+    def resume(self):
+        """
+        :return: tuple of ( first page to export, size of the output to keep )
+        """
+        checkpoint = self.checkpoint.load()
+        if not checkpoint:
+            return 1, 0
+        if checkpoint.get('search') != self.search:
+            raise ValueError(self.path + " is being exported for another search. Remove " +
+                             self.checkpoint.path + " to start over.")
+        self.exported = checkpoint['exported']
+        self.recent.extend(set(tuple(key) for key in keys) for keys in checkpoint.get('recent', []))
+        return checkpoint['page'] + 1, checkpoint['size']
+
+    def run(self):
+        page, size = self.resume()
+        mode = 'r+b' if size and os.path.exists(self.path) else 'wb'
+        with open(self.path, mode) as output:
+            output.seek(size)
+            output.truncate()
+            hits = get_search_page(self.query, page)
+            while hits:
+                recent = set().union(*self.recent)
+                seen = set(recent)
+                hits = canonicalize_results(hits, seen)
+                self.recent.append(seen - recent)
+                pending = self.start_fetching(hits)
+                next_hits = get_search_page(self.query, page + 1)
+                for question in self.results(pending, len(hits)):
+                    output.write((json.dumps(export_record(question)) + '\n').encode('utf-8'))
+                    self.exported += 1
+                output.flush()
+                os.fsync(output.fileno())
+                self.checkpoint.update({'search': self.search, 'page': page, 'size': output.tell(),
+                                        'exported': self.exported,
+                                        'recent': [sorted(keys, key=str) for keys in self.recent]})
+                print_green("Page %d done, %d questions exported." % (page, self.exported))
+                page += 1
+                hits = next_hits
+        try:
+            self.checkpoint.delete()
+        except OSError:
+            pass  # Nothing was found
+        try:
+            # No other process writes the checkpoint of this output, unlike the stores shared by all of socli
+            os.remove(self.checkpoint.path + '.lock')
+        except OSError:
+            pass
+
+    def start_fetching(self, hits):
+        """
+        Fetches questions in worker threads.
+        :param hits: list of SearchHit objects
+        :return: queue receiving ( index, Question or None, exception or None ) per hit
+        """
+        jobs = queue.Queue()
+        for index, hit in enumerate(hits):
+            jobs.put((index, hit.url))
+        done = queue.Queue()
+
+        def work():
+            while True:
+                try:
+                    index, url = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    done.put((index, get_question_stats_and_answer(url), None))
+                except (Exception, SystemExit) as e:
+                    done.put((index, None, e))
+
+        for _ in range(min(self.workers, len(hits))):
+            worker = threading.Thread(target=work)
+            worker.daemon = True
+            worker.start()
+        return done
+
+    def results(self, done, count):
+        """
+        Yields the fetched questions in result order.
+        :param done: queue returned by start_fetching
+        :param count: number of questions fetched
+        """
+        arrived = {}
+        for index in range(count):
+            while index not in arrived:
+                arrived_index, question, error = done.get()
+                arrived[arrived_index] = (question, error)
+            question, error = arrived.pop(index)
+            if isinstance(error, SystemExit):
+                raise error  # Captcha, the page is exported again next time
+            if error is not None:
+                showerror(error)
+                self.failed += 1
+                continue
+            yield question
+
+
+def export(query, path):
+    """
+    Exports the questions found by a search to a json lines file.
+    :param query: SearchQuery object
+    :param path: file to write
+    :return:
+    """
+    exporter = Exporter(query, path)
+    try:
+        exporter.run()
+        print_green("Exported %d questions to %s." % (exporter.exported, path))
+        if exporter.failed:
+            print_warning("%d questions could not be fetched." % exporter.failed)
+    except ValueError as e:
+        print_warning(str(e))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print_warning("\nInterrupted. Run the same command again to continue the export.")
+        sys.exit(1)
+    except UnicodeEncodeError:
+        print_warning("\n\nEncoding error: Use \"chcp 65001\" command before using socli...")
+        sys.exit(0)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        print_fail("Please check your internet connectivity... Run the same command again to continue the export.")
+    except Exception as e:
+        showerror(e)
+        sys.exit(0)
+
+
+def warm_entries(path, engine=None):
+    """
+    Reads the entries to warm the cache with: one per line, either a question url, a query,
+    or a socli command. In shell history files, whose name ends with "history", only the socli
+    commands are read. Empty lines and comments are skipped.
+    :param path: file to read
+    :param engine: search engine of plain queries, SearchQuery.GOOGLE if None
+    :return: list of urls and SearchQuery objects, without duplicates, at most WARM_ENTRIES of the last ones
+    """
+    import shlex
+    history = path.endswith('history')
+    entries = OrderedDict()
+    with open(path) as lines:
+        for line in lines:
+            line = line.strip()
+            if line.startswith(': ') and ';' in line:  # zsh extended history
+                line = line.split(';', 1)[1]
+            if not line or line.startswith('#'):
+                continue
+            if ' ' not in line and (question_url_re.search(line) or answer_url_re.search(line)):
+                entry = line
+            elif line.split()[0] == 'socli':
+                try:
+                    namespace = parseArguments(shlex.split(line)[1:], quiet=True)
+                except ValueError:  # Bad arguments, or unbalanced quotes
+                    continue
+                text = ' '.join(namespace.query + namespace.userQuery)
+                if namespace.watch:
+                    entry = namespace.watch
+                elif not (text.strip() or namespace.tag) or namespace.export:
+                    continue
+                else:
+                    try:
+                        site_names = sites.names(namespace.site) or (sites.DEFAULT_SITE,)
+                    except KeyError:
+                        continue
+                    query = SearchQuery(text, namespace.tag,
+                                        SearchQuery.STACKOVERFLOW if namespace.sosearch else SearchQuery.GOOGLE)
+                    for site in site_names[:-1]:  # Every site is warmed on its own
+                        entries.pop(query.on(site), None)
+                        entries[query.on(site)] = True
+                    entry = query.on(site_names[-1])
+            elif history:  # Another shell command
+                continue
+            else:
+                entry = SearchQuery(line, engine=engine or SearchQuery.GOOGLE)
+            entries.pop(entry, None)
+            entries[entry] = True
+    return list(entries)[-WARM_ENTRIES:]
+
+
+class CacheWarmer(object):
+    """
+    Fetches search results and questions into the disk cache, skipping the ones that are cached
+    and recent enough. Several threads share the work, and a rate limiter keeps the requests below
+    what Stack Overflow and Google tolerate.
+    For a query, the first page of results is cached, and then its WARM_RESULTS first questions.
+    """
+
+    def __init__(self, workers=WARM_WORKERS, rate=WARM_RATE):
+        """
+        :param workers: number of threads fetching
+        :param rate: requests per second
+        """
+        self.workers = workers
+        self.limiter = network.RateLimiter(rate, burst=workers)
+        self.jobs = queue.Queue()
+        self.queued = set()  # Entries queued so far, so that each one is warmed once
+        self.lock = threading.Lock()
+        self.fetched = 0
+        self.fresh = 0
+        self.failed = 0
+        self.stopped = None  # SystemExit raised by a captcha check
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def add(self, entry):
+        with self.lock:
+            if entry in self.queued:
+                return
+            self.queued.add(entry)
+        self.jobs.put(entry)
+
+    def run(self, entries):
+        """
+        Warms the cache and returns when done.
+        :param entries: list of question urls and SearchQuery objects
+        """
+        for entry in entries:
+            self.add(entry)
+        for _ in range(self.workers):
+            worker = threading.Thread(target=self.work)
+            worker.daemon = True
+            worker.start()
+        self.jobs.join()
+        if self.stopped is not None:
+            raise self.stopped
+
+    def work(self):
+        while True:
+            entry = self.jobs.get()
+            try:
+                if self.stopped is None:
+                    if isinstance(entry, SearchQuery):
+                        self.warm_query(entry)
+                    else:
+                        self.warm_question(entry)
+            except SystemExit as e:
+                self.stopped = e
+            except Exception as e:
+                showerror(e)
+                self.count('failed')
+            finally:
+                self.jobs.task_done()
+
+    def warm_query(self, query):
+        age = query.site.page_cache.age(query.url())
+        if age is not None and age < SEARCH_MAX_AGE:
+            self.count('fresh')
+        else:
+            self.limiter.wait()
+            self.count('fetched')
+        questions = cluster.collapse(canonicalize_results(get_search_page(query)),
+                                     lambda hit: thread_key(hit.url), cached_duplicate_of, COLLAPSE_SIMILAR)
+        for question in questions[:WARM_RESULTS]:
+            self.add(question.url)
+
+    def warm_question(self, url):
+        age = site_of(url).question_cache.age(url)
+        if age is not None and age < QUESTION_MAX_AGE:
+            self.count('fresh')
+            return
+        self.limiter.wait()
+        get_question_stats_and_answer(url)
+        self.count('fetched')
+
+
+def warm(path, engine=None):
+    """
+    Fills the disk cache with the search results and questions listed in a file.
+    :param path: file listing queries, question urls or socli commands, like a shell history file
+    :param engine: search engine of plain queries
+    :return:
+    """
+    try:
+        entries = warm_entries(path, engine)
+        warmer = CacheWarmer()
+        print_warning("Warming the cache with %d queries and questions..." % len(entries))
+        warmer.run(entries)
+        print_green("%d pages downloaded, %d already cached." % (warmer.fetched, warmer.fresh))
+        if warmer.failed:
+            print_warning("%d could not be fetched." % warmer.failed)
+    except (IOError, OSError) as e:
+        print_fail("Could not read " + path + ": " + str(e))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print_warning("\nInterrupted.")
+        sys.exit(1)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         print_fail("Please check your internet connectivity...")
     except Exception as e:
         showerror(e)
@@ -841,7 +2438,7 @@ def userpage(userid):
     :return:
     """
     global app_data
-    import stackexchange
+    from . import quota
 
     try:
         userid = int(userid)
@@ -852,9 +2449,11 @@ def userpage(userid):
         exit(1)
 
     try:
+        if not app_data:
+            load_datafile()
         if "api_key" not in app_data:
             app_data["api_key"] = None
-        userprofile = stackexchange.Site(stackexchange.StackOverflow, app_key=app_data["api_key"]).user(userid)
+        userprofile = quota.Site(quota.stackexchange.StackOverflow, app_key=app_data["api_key"]).user(userid)
         print(bold("\n User: " + userprofile.display_name.format()))
         print("\n\tReputations: " + userprofile.reputation.format())
         print_warning("\n\tBadges:")
@@ -863,21 +2462,27 @@ def userpage(userid):
         print("\t\t Bronze: " + str(userprofile.bronze_badges))
         print("\t\t  Total: " + str(userprofile.badge_total))
         print_warning("\n\tStats:")
+        # Every fetch is an API request, each one is done once
         total_questions = len(userprofile.questions.fetch())
         unaccepted_questions = len(userprofile.unaccepted_questions.fetch())
         accepted = total_questions - unaccepted_questions
         rate = 0 if (total_questions==0) else ((accepted / float(total_questions)) * 100)
-        print("\t\t Total Questions Asked: " + str(len(userprofile.questions.fetch())))
+        print("\t\t Total Questions Asked: " + str(total_questions))
         print('\t\t        Accept rate is: %.2f%%.' % rate)
         #check if the user have answers and questions or no.
-        if userprofile.top_answer_tags.fetch():
-            print('\nMost experienced on %s.' % userprofile.top_answer_tags.fetch()[0].tag_name)
+        top_answer_tags = userprofile.top_answer_tags.fetch()
+        if top_answer_tags:
+            print('\nMost experienced on %s.' % top_answer_tags[0].tag_name)
         else:
             print("You have 0 answers")
-        if userprofile.top_question_tags.fetch():
-            print('Most curious about %s.' % userprofile.top_question_tags.fetch()[0].tag_name)
+        top_question_tags = userprofile.top_question_tags.fetch()
+        if top_question_tags:
+            print('Most curious about %s.' % top_question_tags[0].tag_name)
         else:
             print("You have 0 questions")
+        api_quota = quota.remaining(app_data["api_key"])
+        if api_quota is not None and api_quota[1] and api_quota[0] < api_quota[1] / 10:
+            print_warning("\nOnly %d of the %d daily API requests are left." % api_quota)
 
 
         x=input('c: check another profile, d: delete this user information and exit, any key: save information and exit \n')
@@ -897,6 +2502,13 @@ def userpage(userid):
     except urllib.error.URLError:
         print_fail("Please check your internet connectivity...")
         exit(1)
+    except quota.QuotaExceededError as e:
+        print_warning(str(e) + ". Use http://stackapps.com/apps/oauth/register to register a new API key, "
+                      "then set it with socli -a.")
+        exit(1)
+    except quota.BackoffError as e:
+        print_warning(str(e) + ". Try again then, the API key is fine.")
+        exit(1)
     except Exception as e:
         showerror(e)
         if str(e) == "400 [bad_parameter]: `key` doesn't match a known application":
@@ -930,32 +2542,31 @@ def set_api_key():
     api_key = inputs("Type an API key to continue: ")
     if len(api_key) > 0:
         app_data["api_key"] = api_key
-        save_datafile()
+        save_datafile("api_key")
     print_warning("\nAPI Key saved...")
 
 
-def save_datafile():
+def save_datafile(*keys):
     """
     Saves the app_data dictionary to a file named data_file
+    Only the given keys are written, other keys in the file are kept as they are,
+    so that socli processes running at the same time do not undo each other's changes.
+    :param keys: keys of app_data to save, all of them if none is given
     :return:
     """
-    # import json => Json imported globally
     global app_data
-    global data_file
-    with open(data_file, "w") as dataf:
-        json.dump(app_data, dataf)
+    changes = app_data if not keys else dict((key, app_data[key]) for key in keys)
+    app_data = data_store.update(changes)
 
 
 def load_datafile():
     """
     Loads the app_data dictionary form a file named data_file
+    An unreadable file is set aside and treated as empty.
     :return:
     """
-    # import json => Json imported globally
     global app_data
-    global data_file
-    with open(data_file) as dataf:
-        app_data = json.load(dataf)
+    app_data = data_store.load()
 
 
 def del_datafile():
@@ -963,10 +2574,9 @@ def del_datafile():
     Deletes the data file
     :return:
     """
-    global data_file
     try:
-        os.remove(data_file)
-    except FileNotFoundError:
+        data_store.delete()
+    except (OSError, FileNotFoundError):
         print_warning("File not created.... Use socli -u to create a new configuration file.")
         exit(0)
 
@@ -1014,7 +2624,7 @@ def get_stats(soup):
     """
     Get Question stats
     :param soup:
-    :return:
+    :return: tuple of ( question_title, question_desc, question_stats, question_desc_markup )
     """
     question_title = (soup.find_all("a", class_="question-hyperlink")[0].get_text())
     question_stats = (soup.find_all("div", class_="js-vote-count")[0].get_text())
@@ -1023,52 +2633,147 @@ def get_stats(soup):
                                                                 .get_text()).replace("\n", " ")).replace("     "," | "))
     except IndexError as e:
         question_stats = "Could not load statistics."
-    question_desc = (soup.find_all("div", class_="post-text")[0])
-    add_urls(question_desc)
-    question_desc = question_desc.get_text()
+    question_desc_markup = render_post(soup.find_all("div", class_="post-text")[0])
+    question_desc = markup_text(question_desc_markup)
     question_stats = ' '.join(question_stats.split())
-    return question_title, question_desc, question_stats
+    return question_title, question_desc, question_stats, question_desc_markup
 
 
-def add_urls(tags):
+def get_answers(soup, language=None, answer_ids=None):
     """
-    Adds the URL to any hyperlinked text found in a question
-    or answer.
-    :param tags:
+    Get the answers of a question page along with their votes, author, dates and code
+    :param soup:
+    :param language: language of the code blocks that do not tell theirs
+    :param answer_ids: set of the ids of the answers to parse, None for all of them
+    :return: list of Answer objects in page order
     """
-    images = tags.find_all("a")
-
-    for image in images:
-        if hasattr(image, "href"):
-            image.string = "{} [{}]".format(image.text, image['href'])
+    answers = []
+    for answer in soup.find_all("div", class_="answer"):
+        answer_id = answer.get("data-answerid")
+        answer_id = int(answer_id) if answer_id and answer_id.isdigit() else None
+        if answer_ids is not None and answer_id not in answer_ids:
+            continue
+        post = answer.find("div", class_="post-text")
+        if post is None:
+            continue
+        score = 0
+        votes = answer.find("div", class_="js-vote-count")
+        if votes is not None:
+            try:
+                score = int(votes.get("data-value") or votes.get_text().strip())
+            except ValueError:
+                pass
+        author = created = edited = None
+        for user_info in answer.find_all("div", class_="user-info"):
+            action = user_info.find("div", class_="user-action-time")
+            action_text = action.get_text().strip() if action is not None else ""
+            when = user_info.find("span", class_="relativetime")
+            when = when.get("title", when.get_text()) if when is not None else None
+            if action_text.startswith("edited"):
+                edited = when
+            else:
+                created = when
+                details = user_info.find("div", class_="user-details")
+                if details is not None:
+                    name = details.find("a") or details
+                    author = ' '.join(name.get_text().split()) or None
+        accepted = "accepted-answer" in answer.get("class", []) or answer.get("itemprop") == "acceptedAnswer"
+        code_blocks = [(code_language(code, language), code.get_text().rstrip("\n")) for code in post.find_all("pre")]
+        markup = render_post(post)
+        answers.append(Answer(markup_text(markup), score, accepted, author, created, edited, code_blocks, markup,
+                              answer_id))
+    if not answers and answer_ids is None:
+        # Unknown page layout, fall back to the plain posts without metadata
+        answers = [Answer(s.get_text()) for s in soup.find_all("div", class_="post-text")][
+                  1:]  # first post is question, discard it.
+    return answers
+
+
+def get_related(soup, base_url=sourl):
+    """
+    Get the questions of the Linked and Related sidebars of a question page
+    :param soup:
+    :param base_url: url of the site of the page, to complete relative links
+    :return: tuple of ( linked, related ), lists of SearchHit objects
+    """
+    sidebars = []
+    seen = set()  # A question can be both linked and related, it is listed as linked only
+    for sidebar_class in ("sidebar-linked", "sidebar-related"):
+        questions = []
+        sidebar = soup.find("div", class_=sidebar_class)
+        if sidebar is not None:
+            for link in sidebar.find_all("a", class_="question-hyperlink"):
+                url = link.get("href", "")
+                if url.startswith("/"):
+                    url = base_url + url
+                votes = link.parent.find(class_="answer-votes") if link.parent is not None else None
+                desc = "Votes " + votes.get_text().strip() if votes is not None else ""
+                questions.append(SearchHit(' '.join(link.get_text().split()), desc, url))
+        sidebars.append(canonicalize_results(questions, seen))
+    return tuple(sidebars)
+
+
+def get_duplicate_of(soup, base_url=sourl):
+    """
+    Get the question a question page was closed as a duplicate of
+    :param soup:
+    :param base_url: url of the site of the page, to complete relative links
+    :return: url of the original question, the first one if there are several, None if the question is not a duplicate
+    """
+    for notice in soup.find_all(class_=["question-originals-of-duplicate", "post-notice"]):
+        if not duplicate_notice_re.search(notice.get_text()):
+            continue
+        for link in notice.find_all("a", href=question_url_re):
+            url = link.get("href")
+            return base_url + url if url.startswith("/") else url
+    return None
 
 
-def hastags():
+def page_language(soup):
     """
-    Gets the tags and adds them to query url
-    :return:
+    Language of the code on a question page, as set by Stack Overflow from the question's tags
+    :param soup:
+    :return: language name, or the first tag of the question if the page does not tell
     """
-    global soqurl
-    global tag
-    for tags in tag:
-        soqurl = soqurl + "[" + tags + "]" + "+"
+    hint = soup.find("div", id="js-codeblock-lang")
+    if hint is not None:
+        language = code_language(hint)
+        if language:
+            return language
+    tag = soup.find("a", class_="post-tag")
+    return tag.get_text() if tag is not None else None
 
 
-def dispres(url):
+def code_language(tag, default=None):
+    """
+    Language of a code block, from its lang-* or language-* class
+    :param tag: pre tag or the tag holding the language hint
+    :param default: returned when the tag does not tell
+    """
+    classes = list(tag.get("class", []))
+    if tag.code is not None:
+        classes += tag.code.get("class", [])
+    classes.append(tag.get_text().strip() if tag.name == "div" else "")
+    for name in classes:
+        for prefix in ("lang-", "language-"):
+            if name.startswith(prefix):
+                language = name[len(prefix):]
+                return "text" if language == "none" else language
+    return default
+
+
+def dispres(url, question=None):
     """
     Display result page
     :param url: URL of the search result
+    :param question: Question object of the url if it was fetched already
     :return:
     """
     global question_post
     global header_for_display
     global LOOP
-    randomheaders()
-    res_page = requests.get(url, headers=header)
-    captchacheck(res_page.url)
     header_for_display = Header()
-    question_title, question_desc, question_stats, answers = get_question_stats_and_answer(url)
-    question_post = QuestionPage((answers, question_title, question_desc, question_stats, url))
+    question_post = QuestionPage(question or get_question_stats_and_answer(url))
     LOOP = EditedMainLoop(question_post, palette)
     LOOP.run()
 
@@ -1093,7 +2798,7 @@ def fixGoogleURL(url):
         url = "https://" + url #Add the protocol if it doesn't already exist
 
     #Makes sure that we stay in the questions section of Stack Overflow
-    if not bool(re.search("/questions/[0-9]+", url)) and not bool(re.search("\.com/a/[0-9]", url)):
+    if not question_url_re.search(url) and not answer_url_re.search(url):
         return None
 
     if url[:17] == "https:///url?url=": #Resolves rare bug in which this is a prefix
@@ -1102,25 +2807,97 @@ def fixGoogleURL(url):
     return url
 
 
+def canonicalize_results(questions, seen=None):
+    """
+    Rewrites the urls of a batch of search results to the canonical question url, and drops
+    results pointing to a thread that is already listed, e.g. an answer link of a question
+    that was found too.
+    Links to answers are matched to their question once a page of that question has been fetched.
+    :param questions: list of SearchHit objects
+    :param seen: set of thread keys of the results listed before, updated in place
+    :return: list of SearchHit objects, one per thread
+    """
+    if seen is None:
+        seen = set()
+    unique = []
+    for question in questions:
+        match = thread_url_re.match(question.url)
+        if match is None:
+            unique.append(question)
+            continue
+        host, question_id, slug, short_question_id, answer_id = match.groups()
+        question_id = question_id or short_question_id
+        if question_id is None:
+            question_id = answer_questions.get((host, int(answer_id)))
+        if question_id is not None:
+            question.question_id = int(question_id)
+            question.url = "https://" + host + "/questions/" + str(question_id) + (slug or "")
+            key = (host, question.question_id)
+        else:
+            key = (host, "a", int(answer_id))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(question)
+    return unique
+
+
+def thread_key(url):
+    """
+    :param url: url of a question or of an answer
+    :return: tuple of ( host, question id ) identifying the thread, None if it is not known
+    """
+    match = thread_url_re.match(url)
+    if match is None:
+        return None
+    host, question_id, slug, short_question_id, answer_id = match.groups()
+    question_id = question_id or short_question_id
+    if question_id is None:
+        question_id = answer_questions.get((host, int(answer_id)))
+    return (host, int(question_id)) if question_id is not None else None
+
+
+def cached_duplicate_of(hit):
+    """
+    Thread of the question a search result was closed as a duplicate of, if that question was fetched before.
+    Reads the index of duplicates of the site, which is held in memory, so it costs no request.
+    :param hit: SearchHit object
+    :return: see thread_key, None if the question is not a known duplicate
+    """
+    duplicate_of = site_of(hit.url).duplicate_of(hit.url)
+    return thread_key(duplicate_of) if duplicate_of else None
+
+
+def remember_answer_question(url, question_url):
+    """
+    Records which question an answer link belongs to, so that later results linking
+    to the answer are recognized as the same thread.
+    :param url: url the question page was fetched with
+    :param question_url: url of the question, as linked from its page
+    """
+    answer = thread_url_re.match(url)
+    question = question_url_re.search(question_url or "")
+    if answer is not None and answer.group(5) is not None and question is not None:
+        answer_questions[(answer.group(1), int(answer.group(5)))] = int(question.group(1))
+
+
 def captchacheck(url):
     """
     Exits program when their is a captcha. Prevents errors.
     Users will have to manually verify their identity.
-    :param url: URL of stackoverflow
+    :param url: URL the response came from
     :return:
     """
-    if google_search:
+    #Check if google detects user as a bot
+    if google_captcha_re.search(url):
         googleErrorDisplayMessage = "Google thinks you're a bot because you're issuing too many queries too quickly! " + \
                                     "Now you'll have to wait about an hour before you're unblocked... :(. Use the -s tag " + \
                                     "to search via Stack Overflow instead."
-        #Check if google detects user as a bot
-        if re.search("ipv4\.google\.com/sorry", url):
-            print_warning(googleErrorDisplayMessage)
-            exit(0)
-    else:
-        if re.search("\.com/nocaptcha", url): # Searching for stackoverflow captcha
-            print_warning("StackOverflow captcha check triggered. Please wait a few seconds before trying again.")
-            exit(0)
+        print_warning(googleErrorDisplayMessage)
+        exit(0)
+    if so_captcha_re.search(url): # Searching for stackoverflow captcha
+        print_warning("StackOverflow captcha check triggered. Please wait a few seconds before trying again.")
+        exit(0)
 
 def retrieveSavedProfile():
     """
@@ -1129,7 +2906,6 @@ def retrieveSavedProfile():
 
     :return: The user's ID as an integer
     """
-    global data_file
     global app_data
     user = None
     try:
@@ -1138,18 +2914,12 @@ def retrieveSavedProfile():
             user = app_data["user"]
         else:
             raise FileNotFoundError  # Manually raising to get value
-    except JSONDecodeError:
-        # This maybe some write failures
-        del_datafile()
-        print_warning("Error in parsing the data file, it will be now deleted. Please rerun the "
-                      "socli -u command.")
-        exit(1)
     except FileNotFoundError:
         print_warning("Default user not set...\n")
         try:
             # Code to execute when first time user runs socli -u
             app_data['user'] = int(inputs("Enter your Stackoverflow User ID: "))
-            save_datafile()
+            save_datafile('user')
             user = app_data['user']
             print_green("\nUserID saved...\n")
         except ValueError:
@@ -1172,12 +2942,9 @@ def auth_callback(response):
 
 def doc_support():
     from bs4 import BeautifulSoup as soup
-    from urllib.request import urlopen
 
     def parseHTML(url):
-        client = urlopen(url)
-        page_html = client.read()
-        client.close()
+        page_html = network.get(get_session(), url).content
         page_soup = soup(page_html,"html.parser")
         return page_soup
 
@@ -1262,16 +3029,27 @@ def doc_support():
             flag = 1
             sys.exit(0)
 
-def parseArguments(command):
+class QuietArgumentParser(argparse.ArgumentParser):
+    """
+    Argument parser raising ValueError on bad arguments, instead of printing the usage and exiting.
+    """
+
+    def error(self, message):
+        raise ValueError(message)
+
+
+def parseArguments(command, quiet=False):
     """
     Parses the command into arguments and flags
     :param command: the command in list form
+    :param quiet: raise ValueError for bad arguments instead of printing the usage and exiting
     :return: an object that contains the values for all arguments
 
     Currently, all help messages are not in use and helpman() is the default.
     Need to implement nicer --help format in the future.
     """
-    parser = argparse.ArgumentParser(description=textwrap.dedent('Stack Overflow command line client'), add_help=False)
+    parser_class = QuietArgumentParser if quiet else argparse.ArgumentParser
+    parser = parser_class(description=textwrap.dedent('Stack Overflow command line client'), add_help=False)
 
     #Comment this line out if you want to use argparse's default help function
     parser.add_argument('--help', '-h', action='store_true', help='Show this help message and exit')
@@ -1312,6 +3090,19 @@ def parseArguments(command):
     parser.add_argument('--login', '-l', action='store_true', help="Prompt a user for email and password to login to StackOverflow.")
     parser.add_argument('--logout', action='store_true', help="Log a user out of StackOverflow")
     parser.add_argument('--doc', action='store_true', help="View Python documentation")
+    parser.add_argument('--watch', '-w', metavar='URL', help="Prints the new and edited answers of a question as they are posted")
+    parser.add_argument('--no-cache', action='store_true', help="Downloads search results and questions again instead of using the copies cached on disk")
+    parser.add_argument('--site', nargs='+', default=[], help="Stack Exchange sites to search instead of Stack Overflow, "
+                                                             "e.g. serverfault superuser unix askubuntu or any host of stackexchange.com")
+    parser.add_argument('--mem-stats', action='store_true', help="Shows the memory used by interactive mode in the question list, and when it ends")
+    parser.add_argument('--mem-limit', type=float, metavar='MB', help="Megabytes of answer widgets kept in interactive mode")
+    parser.add_argument('--rerank', action='store_true', help="Orders search results by their similarity to the query before picking one")
+    parser.add_argument('--collapse-similar', action='store_true', help="Also hides search results with the same title words and nearly the same text as an earlier one")
+    parser.add_argument('--timeout', type=float, help="Seconds to wait for Stack Overflow or Google before giving up on a request")
+    parser.add_argument('--retries', type=int, help="Number of times a failed download is tried again")
+    parser.add_argument('--hedge', type=float, metavar='SECONDS', help="Sends a second request for a page that takes longer than SECONDS, and uses the first response")
+    parser.add_argument('--warm', metavar='FILE', help="Caches the search results and questions listed in FILE, like a list of queries or a shell history file")
+    parser.add_argument('--export', '-e', metavar='FILE', help="Writes all the questions found by the query or tags, with their answers, to FILE as json lines")
 
     namespace = parser.parse_args(command)
     return namespace
@@ -1322,7 +3113,6 @@ def main():
     """
 
     global query
-    global google_search
     namespace = parseArguments(sys.argv[1:])
     loaduseragents() #Populates the user agents array
     query = ' '.join(namespace.query) + ' ' + ' '.join(namespace.userQuery)
@@ -1332,6 +3122,21 @@ def main():
     if namespace.debug: #If --debug flag is present
         global DEBUG
         DEBUG = True
+    network.configure(read_timeout=namespace.timeout, retries=namespace.retries, hedge_after=namespace.hedge)
+    if namespace.no_cache: #If --no-cache flag is present
+        global SEARCH_MAX_AGE, QUESTION_MAX_AGE
+        SEARCH_MAX_AGE = QUESTION_MAX_AGE = 0
+    if namespace.mem_stats: #If --mem-stats flag is present
+        global MEM_STATS
+        MEM_STATS = True
+    if namespace.mem_limit is not None: #If --mem-limit flag is present
+        rendered_answers.resize(int(namespace.mem_limit * 1024 * 1024))
+    if namespace.rerank: #If --rerank flag is present
+        global RERANK
+        RERANK = True
+    if namespace.collapse_similar: #If --collapse-similar flag is present
+        global COLLAPSE_SIMILAR
+        COLLAPSE_SIMILAR = True
     if namespace.new: #If --new flag is present
         import webbrowser
         print_warning("Opening stack overflow in your browser...")
@@ -1355,19 +3160,37 @@ def main():
         del_datafile()
         print_warning("Data files deleted...")
         sys.exit(0)
+    engine = SearchQuery.GOOGLE
     if namespace.sosearch: #If --sosearch flag is present
-        google_search = False
-    if namespace.tag: #If --tag flag is present
-        global tag
-        google_search = False
-        tag = namespace.tag
-        hastags()
+        engine = SearchQuery.STACKOVERFLOW
+    try:
+        site_names = sites.names(namespace.site) or (sites.DEFAULT_SITE,)
+    except KeyError as e:
+        print_warning('Unknown site: ' + str(e.args[0]) + '. Use one of ' + ', '.join(sites.sites) +
+                      ', or the host of a site, e.g. "socli --site math.stackexchange.com ...".')
+        sys.exit(1)
+    search = SearchQuery(query, namespace.tag, engine, site_names) #Searches with tags use Stack Overflow search
     if namespace.doc: # If --doc flag is present
         doc_support()
+    if namespace.watch: # If --watch flag is present
+        if not app_data:
+            load_datafile()
+        watch(namespace.watch)
+        sys.exit(0)
+    if namespace.warm: #If --warm flag is present
+        warm(namespace.warm, engine)
+        sys.exit(0)
+    if namespace.export: #If --export flag is present
+        if namespace.query == [] and namespace.tag == None and query.strip() == '':
+            print_warning('You must specify a query or a tag. For example, use: "socli -e python.jsonl -t python" '
+                'to export the questions tagged "python".')
+            sys.exit(1)
+        export(search, namespace.export)
+        sys.exit(0)
     if namespace.res != None: #If --res flag is present
         questionNumber = namespace.res
         if namespace.query != [] or namespace.tag != None: #There must either be a tag or a query
-            socl_manusearch(query, questionNumber)
+            socl_manusearch(search, questionNumber)
         else:
             print_warning('You must specify a query or a tag. For example, use: "socli -r 3 -q python for loop" '
                 'to retrieve the third result when searching about "python for loop". You can also use "socli -r 3 -t python" '
@@ -1381,11 +3204,11 @@ def main():
         auth_callback(resp_data)
     elif namespace.query != [] or namespace.tag != None: #If query and tag are not both empty
         if namespace.interactive:
-            socli_interactive(query)
+            socli_interactive(search)
         else:
-            socli(query)
+            socli(search)
     elif query != ' ' and not (namespace.tag or namespace.res or namespace.interactive): #If there are no flags
-        socli(query)
+        socli(search)
     else:
         #Help text for interactive mode
         if namespace.interactive and namespace.query == [] and namespace.tag == None:
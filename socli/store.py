@@ -0,0 +1,222 @@
+"""
+Files socli keeps on behalf of the user, outside of the package directory.
+"""
+
+import copy
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+try:
+    JSONDecodeError = json.JSONDecodeError
+except AttributeError:
+    JSONDecodeError = ValueError
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# os.replace overwrites the target atomically, also on Windows. Python 2 only has rename.
+_replace = getattr(os, 'replace', os.rename)
+
+
+def user_data_dir():
+    """
+    :desc: Directory socli writes its files to. SOCLI_HOME if set, otherwise
+           %APPDATA%/socli on Windows and $XDG_CONFIG_HOME/socli (~/.config/socli) elsewhere.
+    :return: path of the directory, which may not exist yet
+    """
+    if os.environ.get('SOCLI_HOME'):
+        return os.environ['SOCLI_HOME']
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(base, 'socli')
+
+
+def user_data_path(name):
+    """
+    :desc: Path of a file in the user data directory.
+    :param: name - file name
+    """
+    return os.path.join(user_data_dir(), name)
+
+
+def _makedirs(directory):
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+
+def atomic_write(path, data, sync=True):
+    """
+    :desc: Replaces the content of a file at once. Data is written to a temporary
+           file next to it, which is then renamed over it, so readers see either
+           the old or the new content and never a partly written file.
+    :param: path - file to write, its directory is created if missing
+            data - `bytes` or `str` to write
+            sync - flush the data to the disk before the rename, False for files
+                   that can be lost, like caches
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    _makedirs(directory)
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+            if sync:
+                tmp.flush()
+                os.fsync(tmp.fileno())
+        _replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def file_lock(path):
+    """
+    :desc: Holds an exclusive lock on path + '.lock' for the duration of the
+           with block, so that processes do not interleave read-modify-write cycles.
+    :param: path - file to lock
+    """
+    lock_path = path + '.lock'
+    _makedirs(os.path.dirname(os.path.abspath(lock_path)))
+    with open(lock_path, 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class JSONStore(object):
+    """
+    :desc: A json object in a file, safe to share between processes.
+           Writes lock the file, merge into its current content and replace it
+           atomically. Reads need no lock and are served from memory as long as
+           the file has not changed.
+    """
+
+    def __init__(self, path, legacy_path=None):
+        """
+        :param: path - file holding the data
+                legacy_path - earlier location of the file, moved to path on first use
+        """
+        self.path = path
+        self.legacy_path = legacy_path
+        self.lock = threading.Lock()
+        self.cached = None  # (file stat signature, data)
+
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+    def migrate(self):
+        if self.legacy_path and not os.path.exists(self.path) and os.path.exists(self.legacy_path):
+            with file_lock(self.path):
+                if not os.path.exists(self.path):
+                    with open(self.legacy_path, 'rb') as legacy:
+                        atomic_write(self.path, legacy.read())
+            try:
+                os.remove(self.legacy_path)
+            except OSError:
+                pass  # Read only install directory
+            self.legacy_path = None
+
+    def load(self):
+        """
+        :desc: Current content of the file. A file that can not be parsed is
+               moved aside to path + '.corrupt' and treated as empty.
+        :return: `dict`, a deep copy that can be changed freely
+        """
+        return copy.deepcopy(self.current())
+
+    def get(self, key, default=None):
+        """
+        :desc: Value of one key of the file, without copying the rest of it.
+        :return: a deep copy of the value, default if the key is missing
+        """
+        return copy.deepcopy(self.current().get(key, default))
+
+    def current(self):
+        """
+        :return: `dict` of the content held in memory, which must not be changed
+        """
+        self.migrate()
+        with self.lock:
+            signature = self.signature()
+            if signature is None:
+                return {}
+            if self.cached is not None and self.cached[0] == signature:
+                return self.cached[1]
+            try:
+                with open(self.path) as data_file:
+                    data = json.load(data_file)
+            except JSONDecodeError:
+                try:
+                    _replace(self.path, self.path + '.corrupt')
+                except OSError:
+                    pass
+                return {}
+            self.cached = (signature, data)
+            return data
+
+    def update(self, changes):
+        """
+        :desc: Sets keys in the file, keeping the ones written by other processes.
+        :param: changes - `dict` of the keys to set
+        :return: `dict` of the new content
+        """
+        return self.modify(lambda data: data.update(changes))
+
+    def modify(self, change):
+        """
+        :desc: Changes the file with a function, keeping the keys written by other processes.
+        :param: change - function changing the `dict` of the current content in place
+        :return: `dict` of the new content
+        """
+        with file_lock(self.path):
+            data = self.load()
+            change(data)
+            atomic_write(self.path, json.dumps(data))
+            return data
+
+    def delete(self):
+        """
+        :desc: Removes the file.
+        :raises: OSError if the file does not exist
+        """
+        self.migrate()
+        with file_lock(self.path):
+            os.remove(self.path)
+            with self.lock:
+                self.cached = None